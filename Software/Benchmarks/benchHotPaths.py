@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+
+# Micro-benchmarks for the client and server hot paths.
+#
+# Runs each path on recorded/synthetic input and reports ops/sec (best of
+# many short repeats, in process CPU time so time the machine spends on
+# other work does not count), its speed relative to a fixed reference
+# workload, and the peak bytes allocated per call (tracemalloc):
+#   - client parse_gpgga on a recorded $GPGGA sentence
+#   - client read_rfid against a fake serial port replaying reader bytes
+#   - server ingest: StreamFramer + process_batch (BIN1 batches and TEXT
+#     lines), including the debounce, student lookup, log write and the
+#     hand-off to the attendance writer (whose thread is not started)
+#   - server safe_truncate on a mixed-width log line
+#   - server log_attendance
+#   - server name search: a type-ahead prefix and a misspelt name (trigram
+#     fallback) against the 10000-student roster
+#   - the embedded SQLite storage backend: a student lookup by name, a
+#     student list page and a 500-row attendance batch commit
+#   - with --mysql, the student lookup against a real MySQL server: one
+#     connection per lookup vs the server's pool vs the roster cache that
+#     get_student_name now reads. These need a live server, so they have
+#     no entry in baseline.json and have not been measured yet. Until
+#     they are, nothing is claimed about the pool's speed; record the
+#     numbers from a depot's MySQL with --update when one is at hand.
+#
+# Results are compared with baseline.json next to this script; the run
+# fails (exit 1) when a case is slower or allocates more than the
+# threshold allows. Speed is compared relative to the reference workload,
+# which is timed interleaved with every repeat of every case, so the
+# baseline does not hold one machine's absolute ops/sec and a busy or
+# slower machine moves both numbers together. Re-record the baseline with
+# --update whenever a change makes a benchmarked path faster or slower on
+# purpose, and say so in the commit message.
+#
+# The server and client files are loaded by path. The server's roster
+# cache is filled with synthetic students instead of loading MySQL, and
+# attendance logs and the SQLite database are written to a temporary
+# directory.
+#
+# Usage:
+#   python3 benchHotPaths.py [--update] [--threshold 0.2] [--only ingest]
+#                            [--mysql user:password@host/database]
+
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+SOFTWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT_PATH = os.path.join(SOFTWARE_DIR, "Client", "v3.0.0-20250324-alpha.py")
+SERVER_PATH = os.path.join(SOFTWARE_DIR, "Server", "v2.0.0-20250417-alpha.py")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+GPGGA_SENTENCE = "$GPGGA,074353.00,3012.6541,N,09201.1187,W,1,08,0.9,12.3,M,-24.1,M,,*4B"
+GPS_DATA = "07:43:53 UTC | 30.21090166666667, -92.01864500000001"
+EPC_PREFIX = bytes.fromhex("E28068940000")
+
+
+def load_module(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_tags(count):
+    return [(EPC_PREFIX + i.to_bytes(6, "big")).hex().upper() for i in range(count)]
+
+
+# Replays recorded reader output one byte per read(1), like pyserial.
+class FakeSerial:
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.pos = 0
+
+    def read(self, size=1):
+        if self.pos >= len(self.stream):
+            self.pos = 0
+        data = self.stream[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+
+class FakeSocket:
+
+    def sendall(self, data):
+        pass
+
+
+# A fixed pure-Python workload (dict updates, string formatting, sorting)
+# that no change to the client or server touches.
+def reference_op():
+    counts = {}
+    for i in range(200):
+        key = f"tag-{i % 50}"
+        counts[key] = counts.get(key, 0) + i
+    return sorted(counts.items())
+
+
+REFERENCE_ITERATIONS = 50
+RETRIES = 2
+
+
+class Case:
+    """One benchmark: op() is timed, reset() runs untimed between repeats"""
+
+    def __init__(self, name, op, iterations, reset=None, clock=time.process_time):
+        self.name = name
+        self.op = op
+        self.iterations = iterations
+        self.reset = reset or (lambda: None)
+        self.clock = clock          # wall time for cases that wait on a server
+
+
+# --------------- CLIENT CASES --------------- #
+
+def client_cases(client):
+    cases = [Case("client.parse_gpgga", lambda: client.parse_gpgga(GPGGA_SENTENCE), 5000)]
+
+    # Each tag read is framed by header/checksum bytes from the reader.
+    stream = b"".join(b"\xbb\x97\x12\x30\x00" + bytes.fromhex(tag) + b"\x7e\x0d" for tag in make_tags(64))
+    scanner = FakeSerial(stream)
+    cases.append(Case("client.read_rfid", lambda: client.read_rfid(scanner), 500))
+    return cases
+
+
+# --------------- SERVER CASES --------------- #
+
+def server_cases(server, client):
+    tags = make_tags(10000)
+    server.roster.load((f"Student {i}", tag, f"bus-{i % 100}", "School") for i, tag in enumerate(tags))
+
+    cases = []
+    for protocol in ("BIN1", "TEXT"):
+        # 20-event batches; every tag is read twice so half get debounced.
+        frames = []
+        for i in range(1000):
+            events = [(tag, "onboard", GPS_DATA) for tag in tags[i * 10:(i + 1) * 10] for _ in range(2)]
+            frames.append(client.encode_batch(i * 20 + 1, events, protocol))
+        state = {}
+
+        def reset(state=state):
+            server.coordinator = server.Coordinator()
+            server.attendance_writer.pending.clear()
+            state["client"] = server.ClientConnection(FakeSocket(), ("127.0.0.1", 0))
+            state["frames"] = iter(frames * 10)
+
+        def ingest(state=state):
+            connection = state["client"]
+            connection.framer.protocol = protocol
+            connection.framer.feed(next(state["frames"]))
+            server.process_batch(list(connection.framer.messages()), connection)
+
+        reset()
+        cases.append(Case(f"server.ingest_{protocol.lower()}", ingest, 100, reset))
+
+    line = "📥 Received: RFID:E28068940000501E6E52B4F1 | STATUS:onboard | GPS: 07:43:53 UTC | 30.2109, -92.0186 — 학생"
+    cases.append(Case("server.safe_truncate", lambda: server.safe_truncate(line, 60), 2000))
+    cases.append(Case("server.log_attendance", lambda: server.log_attendance("Student 1", "onboard", GPS_DATA), 500))
+    cases.append(Case("server.search_names_prefix", lambda: server.roster.search_names("student 12"), 2000))
+    cases.append(Case("server.search_names_typo", lambda: server.roster.search_names("Stduent 1234"), 20))
+    return cases
+
+
+# --------------- SQLITE CASES --------------- #
+
+def sqlite_cases(server):
+    storage = server.SQLiteStorage(os.path.join(os.getcwd(), "bench.db"))
+    tags = make_tags(10000)
+    storage.execute_many(
+        server.INSERT_STUDENT,
+        [(f"Student {i}", tag, f"bus-{i % 100}", "School") for i, tag in enumerate(tags)]
+    )
+    logged_at = datetime.now().replace(microsecond=0)
+    batch = [(logged_at, tag, "Student", "bus-1", "ONBOARD", GPS_DATA) for tag in tags[:500]]
+    return [
+        Case("sqlite.find_students", lambda: storage.find_students("Student 1234"), 2000),
+        Case("sqlite.student_page",
+             lambda: storage.student_page(("school",), None, True, ("Student 5000", 5001), 201), 50),
+        Case("sqlite.insert_attendance", lambda: storage.insert_attendance(batch), 2,
+             lambda: storage.execute("DELETE FROM attendance")),
+    ]
+
+
+# --------------- MYSQL CASES --------------- #
+
+def mysql_cases(server, dsn):
+    import pymysql
+    credentials, _, location = dsn.rpartition("@")
+    user, _, password = credentials.partition(":")
+    host, _, database = location.partition("/")
+
+    def connect():
+        return pymysql.connect(host=host, user=user, password=password, database=database, autocommit=True)
+
+    server.connect = connect
+    conn = connect()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT rfid_tag FROM students LIMIT 1")
+        row = cursor.fetchone()
+    conn.close()
+    tag = row[0] if row else "E28068940000000000000000"
+
+    def lookup_per_call():
+        conn = connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT name FROM students WHERE rfid_tag = %s", (tag,))
+                cursor.fetchone()
+        finally:
+            conn.close()
+
+    def lookup_pooled():
+        conn = server.db_pool.acquire()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT name FROM students WHERE rfid_tag = %s", (tag,))
+                cursor.fetchone()
+        finally:
+            server.db_pool.release(conn)
+
+    server.roster.refresh()
+    return [
+        Case("db.lookup_per_call", lookup_per_call, 20, clock=time.perf_counter),
+        Case("db.lookup_pooled", lookup_pooled, 200, clock=time.perf_counter),
+        Case("db.lookup_roster", lambda: server.get_student_name(tag), 20000),
+    ]
+
+
+# --------------- MEASUREMENT --------------- #
+
+def timed(op, iterations, clock=time.process_time):
+    gc.disable()
+    start = clock()
+    for _ in range(iterations):
+        op()
+    elapsed = clock() - start
+    gc.enable()
+    return elapsed
+
+
+def measure(case, repeats):
+    # Best of several repeats with the GC off, like timeit, each repeat
+    # right after a run of the reference workload.
+    best = reference = float("inf")
+    for _ in range(repeats):
+        reference = min(reference, timed(reference_op, REFERENCE_ITERATIONS))
+        case.reset()
+        best = min(best, timed(case.op, case.iterations, case.clock))
+    ops_per_sec = case.iterations / best
+    relative = ops_per_sec / (REFERENCE_ITERATIONS / reference)
+
+    # Peak bytes allocated above the starting point, averaged over calls.
+    case.reset()
+    case.op()
+    samples = min(case.iterations - 1, 200)
+    total = 0
+    tracemalloc.start()
+    for _ in range(samples):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        case.op()
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return {"ops_per_sec": round(ops_per_sec, 1), "relative": round(relative, 4), "alloc_bytes": round(total / samples)}
+
+
+def regressions(name, result, baseline, threshold):
+    base = baseline.get(name)
+    if not base:
+        return []
+    problems = []
+    if result["relative"] < base["relative"] * (1 - threshold):
+        problems.append(f"relative speed {result['relative']:.4g} < baseline {base['relative']:.4g}")
+    # Small absolute slack so a few bytes of noise on tiny cases do not fail.
+    if result["alloc_bytes"] > base["alloc_bytes"] * (1 + threshold) + 256:
+        problems.append(f"alloc {result['alloc_bytes']} B > baseline {base['alloc_bytes']} B")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the client and server hot paths.")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    parser.add_argument("--repeats", type=int, default=60)
+    parser.add_argument("--only", help="run only cases whose name contains this")
+    parser.add_argument("--mysql", help="user:password@host/database to also benchmark student lookups")
+    args = parser.parse_args()
+
+    client = load_module(CLIENT_PATH, "bus_client")
+    server = load_module(SERVER_PATH, "bus_server")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)
+
+    cases = client_cases(client) + server_cases(server, client) + sqlite_cases(server)
+    if args.mysql:
+        cases += mysql_cases(server, args.mysql)
+    results = {}
+    failed = []
+    print(f"{'case':<28} {'ops/sec':>12} {'relative':>10} {'alloc B/call':>13}  vs baseline")
+    for case in cases:
+        if args.only and args.only not in case.name:
+            continue
+        result = measure(case, args.repeats)
+        problems = regressions(case.name, result, baseline, args.threshold)
+        # A slowdown must show up again before it fails the run; the
+        # fastest of the measurements is kept.
+        for _ in range(RETRIES if problems and not args.update else 0):
+            retry = measure(case, args.repeats)
+            if retry["relative"] > result["relative"]:
+                result = retry
+            problems = regressions(case.name, result, baseline, args.threshold)
+            if not problems:
+                break
+        results[case.name] = result
+        base = baseline.get(case.name)
+        change = f"{result['relative'] / base['relative'] - 1:+.1%}" if base else "(new)"
+        print(f"{case.name:<28} {result['ops_per_sec']:>12,.0f} {result['relative']:>10.4g} {result['alloc_bytes']:>13,}  {change}"
+              + (f"  ❌ {'; '.join(problems)}" if problems else ""))
+        if problems:
+            failed.append(case.name)
+
+    if args.update:
+        # Absolute ops/sec belong to this machine and this moment; keep the rest.
+        baseline.update({name: {key: result[key] for key in ("relative", "alloc_bytes")}
+                         for name, result in results.items()})
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 Baseline written to {args.baseline}")
+    elif failed:
+        print(f"❌ {len(failed)} case(s) regressed more than {args.threshold:.0%}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,282 @@
 #!/usr/bin/env python3
-import socket 
-import time 
-import random 
 
+# Fleet simulator / load generator for the bus server.
+#
+# Simulates N buses speaking the real v3 client protocol against a server:
+#   - HELLO BUS registration (BIN1 or TEXT, optional zlib uplink)
+#   - buses driving along moving GPS tracks, stopping every so often
+#   - board/alight bursts at each stop, batched and sequenced like the
+#     real client, with resend bookkeeping driven by the server's ACKs
+#   - PONG / LOCATION replies to PING / GET_LOCATION, echoing request ids
+#
+# The encoding (events, batches, compression) is taken from the v3 client
+# itself, so the simulator always speaks exactly what the buses speak.
+#
+# It reports how many buses the server registered (connection capacity),
+# ingest throughput (events acknowledged per second), and event-to-log
+# latency percentiles. The server only ACKs a batch after the attendance
+# log write for it succeeded, so the time from a simulated tag read to
+# its ACK is the event-to-log latency.
+#
+# Tags are random E280... EPCs unless --tags points at a file with one
+# tag per line (use the real roster to exercise the student lookups).
+#
+# Usage:
+#   python3 testClient.py --host 100.81.26.99 --buses 200 --duration 60 --speedup 10
 
-def start_client():
+import argparse
+import asyncio
+import collections
+import importlib.util
+import os
+import random
+import resource
+import time
 
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+CLIENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "v3.0.0-20250324-alpha.py")
 
-    host = "100.81.26.99"
 
-    port = 9999
+def load_client():
+    spec = importlib.util.spec_from_file_location("bus_client", CLIENT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
 
-    message = str(random.randrange(3333, 4444))
-    message = "RF-" + message 
 
-    client_socket.connect((host, port))
+client = load_client()
 
 
-    print(f"Sending {message} to the Server")
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
 
-    client_socket.send(message.encode('utf-8'))
 
-    client_socket.close()
+class FleetStats:
 
-while True:
-    #for step in range(10):
-    start_client()
-    time.sleep(5)
+    def __init__(self):
+        self.attempted = 0
+        self.registered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.connect_latencies = []
+        self.events_sent = 0
+        self.events_acked = 0
+        self.ack_latencies = []
+        self.pings = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
 
 
-    
+# Lets the client's Uplink write to an asyncio stream.
+class StreamSocket:
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def sendall(self, data):
+        self.writer.write(data)
+
+
+class SimulatedBus:
+
+    def __init__(self, index, args, stats, tag_pool):
+        self.bus_id = f"sim-{index:04d}"
+        self.args = args
+        self.stats = stats
+        self.roster = random.sample(tag_pool, min(args.students, len(tag_pool)))
+        self.onboard = set()
+        self.outbox = client.EventOutbox()
+        self.queued_at = collections.deque()    # (seq, perf_counter time), oldest first
+        # Start somewhere around Lafayette, LA and drive at ~10 m/s.
+        self.lat = 30.21 + random.uniform(-0.05, 0.05)
+        self.lon = -92.02 + random.uniform(-0.05, 0.05)
+        self.heading = random.uniform(0, 6.283)
+
+    def gps(self):
+        return f"{time.strftime('%H:%M:%S', time.gmtime())} UTC | {self.lat}, {self.lon}"
+
+    def drive(self, seconds):
+        step = 0.00009 * seconds * self.args.speedup
+        self.heading += random.uniform(-0.3, 0.3)
+        self.lat += step * random.uniform(0.5, 1.0) * (1 if self.heading % 6.283 < 3.14 else -1)
+        self.lon += step * random.uniform(0.5, 1.0) * (1 if (self.heading + 1.57) % 6.283 < 3.14 else -1)
+
+    async def run(self, deadline):
+        self.stats.attempted += 1
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.args.host, self.args.port), timeout=30
+            )
+            protocol, compression, buffer = await self.handshake(reader, writer)
+        except Exception:
+            self.stats.failed += 1
+            return
+        self.stats.connect_latencies.append(time.perf_counter() - start)
+        self.stats.registered += 1
+
+        uplink = client.Uplink(StreamSocket(writer), compression)
+        reader_task = asyncio.create_task(self.read_loop(reader, uplink, protocol, buffer))
+        try:
+            while time.time() < deadline and not reader_task.done():
+                await self.stop_burst()
+                # Drive to the next stop, sending batches as they fall due.
+                until = time.time() + random.uniform(20, 90) / self.args.speedup
+                while time.time() < min(until, deadline) and not reader_task.done():
+                    await self.flush(uplink, protocol, writer)
+                    await asyncio.sleep(0.1)
+                    self.drive(0.1)
+            # Give the last batches time to be acknowledged.
+            end = time.time() + 5
+            while self.outbox.pending() and time.time() < end and not reader_task.done():
+                await self.flush(uplink, protocol, writer)
+                await asyncio.sleep(0.1)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if reader_task.done():
+                self.stats.dropped += 1
+            reader_task.cancel()
+            self.stats.raw_bytes += uplink.raw_bytes
+            self.stats.wire_bytes += uplink.wire_bytes
+            writer.close()
+
+    async def handshake(self, reader, writer):
+        hello = f"HELLO BUS:{self.bus_id} | PROTO:{self.args.protocol} | STREAM:{self.outbox.stream_id} | REQID:1"
+        if self.args.compress:
+            hello += " | COMP:ZLIB"
+        writer.write((hello + "\n").encode('utf-8'))
+        await writer.drain()
+        line = await asyncio.wait_for(reader.readline(), timeout=client.HANDSHAKE_TIMEOUT)
+        reply = line.decode('utf-8', errors='ignore').strip()
+        if not reply.startswith("WELCOME"):
+            raise ConnectionError(f"unexpected handshake reply: {reply!r}")
+        protocol, _, compression = client.parse_welcome(reply, self.outbox)
+        return protocol, compression, b""
+
+    async def stop_burst(self):
+        # Some kids get off, some get on, each a fraction of a second apart.
+        leaving = random.sample(sorted(self.onboard), random.randint(0, len(self.onboard)))
+        waiting = [tag for tag in self.roster if tag not in self.onboard]
+        boarding = random.sample(waiting, random.randint(0, min(len(waiting), self.args.burst)))
+        for tag in leaving + boarding:
+            state = "offboard" if tag in self.onboard else "onboard"
+            (self.onboard.discard if state == "offboard" else self.onboard.add)(tag)
+            seq = self.outbox.append(tag, state, self.gps())
+            self.queued_at.append((seq, time.perf_counter()))
+            await asyncio.sleep(random.uniform(0.2, 1.5) / self.args.speedup)
+
+    async def flush(self, uplink, protocol, writer):
+        while self.outbox.in_flight() < client.MAX_IN_FLIGHT:
+            batch = self.outbox.next_batch()
+            if not batch:
+                break
+            first_seq, events = batch
+            uplink.sendall(client.encode_batch(first_seq, events, protocol), events=len(events))
+            self.stats.events_sent += len(events)
+        await writer.drain()
+
+    async def read_loop(self, reader, uplink, protocol, buffer):
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                return
+            commands, buffer = client.split_lines(buffer + data)
+            for command in commands:
+                if command.startswith("ACK:"):
+                    self.acknowledge(int(command[4:]))
+                    continue
+                name, _, request_id = command.partition(":")
+                if name == "PING":
+                    self.stats.pings += 1
+                    pong = f"{client.reply_head('PONG', request_id)} | {time.strftime('%H:%M:%S')} | {self.gps()}"
+                    client.send_line(uplink, pong, protocol)
+                elif name == "GET_LOCATION":
+                    client.send_line(uplink, f"{client.reply_head('LOCATION', request_id)} | {self.gps()}", protocol)
+
+    def acknowledge(self, seq):
+        now = time.perf_counter()
+        self.outbox.ack(seq)
+        while self.queued_at and self.queued_at[0][0] <= seq:
+            _, queued = self.queued_at.popleft()
+            self.stats.ack_latencies.append(now - queued)
+            self.stats.events_acked += 1
+
+
+async def report_progress(stats, deadline):
+    last_acked, last_time = 0, time.time()
+    while time.time() < deadline:
+        await asyncio.sleep(5)
+        now = time.time()
+        rate = (stats.events_acked - last_acked) / (now - last_time)
+        last_acked, last_time = stats.events_acked, now
+        print(f"⏱️ {stats.registered} bus(es) online, {stats.events_sent} sent, "
+              f"{stats.events_acked} acked, {rate:.0f} events/s")
+
+
+async def run_fleet(args):
+    stats = FleetStats()
+    if args.tags:
+        with open(args.tags) as f:
+            tag_pool = [line.strip().upper() for line in f if line.strip()]
+    else:
+        tag_pool = [f"E280{random.getrandbits(80):020X}" for _ in range(args.buses * args.students)]
+
+    start = time.time()
+    deadline = start + args.ramp + args.duration
+    buses = [SimulatedBus(i, args, stats, tag_pool) for i in range(args.buses)]
+    tasks = []
+    for i, bus in enumerate(buses):
+        tasks.append(asyncio.create_task(bus.run(deadline)))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / args.buses)
+    progress = asyncio.create_task(report_progress(stats, deadline))
+    await asyncio.gather(*tasks)
+    progress.cancel()
+    return stats, time.time() - start - args.ramp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of buses against the server.")
+    parser.add_argument("--host", default="100.81.26.99")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--buses", type=int, default=50, help="number of simulated buses")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of driving after ramp-up")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which buses connect")
+    parser.add_argument("--speedup", type=float, default=10, help="compress time between stops by this factor")
+    parser.add_argument("--students", type=int, default=40, help="students assigned to each bus")
+    parser.add_argument("--burst", type=int, default=15, help="most students boarding at one stop")
+    parser.add_argument("--protocol", choices=("BIN1", "TEXT"), default="BIN1")
+    parser.add_argument("--compress", action="store_true", help="ask for zlib uplink compression")
+    parser.add_argument("--tags", help="file with one RFID tag per line to use instead of random tags")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < args.buses + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, args.buses + 64), hard))
+
+    print(f"🚌 Simulating {args.buses} bus(es) against {args.host}:{args.port} "
+          f"({args.protocol}{', zlib' if args.compress else ''}, speedup x{args.speedup:g})")
+    stats, elapsed = asyncio.run(run_fleet(args))
+
+    print()
+    print(f"🔗 Registered: {stats.registered}/{stats.attempted} bus(es) "
+          f"(failed {stats.failed}, dropped mid-run {stats.dropped}); "
+          f"connect p50={percentile(stats.connect_latencies, 50) * 1000:.1f}ms "
+          f"p99={percentile(stats.connect_latencies, 99) * 1000:.1f}ms")
+    print(f"📥 Events: {stats.events_sent} sent, {stats.events_acked} acknowledged "
+          f"→ {stats.events_acked / elapsed if elapsed > 0 else 0:.1f} events/s ingest")
+    print(f"📝 Event-to-log latency: p50={percentile(stats.ack_latencies, 50) * 1000:.1f}ms "
+          f"p99={percentile(stats.ack_latencies, 99) * 1000:.1f}ms "
+          f"max={max(stats.ack_latencies, default=0) * 1000:.1f}ms")
+    if stats.events_sent:
+        print(f"📦 Uplink: {stats.raw_bytes / stats.events_sent:.1f} B/event raw, "
+              f"{stats.wire_bytes / stats.events_sent:.1f} B/event on the wire")
+    print(f"🛰️ PINGs answered: {stats.pings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+# Connection-storm test for the bus server.
+#
+# Simulates the whole fleet reconnecting at once (e.g. after a cell outage):
+# opens N connections as fast as possible, registers each one with
+# HELLO BUS, holds them all open, and reports how many the server accepted,
+# connect latency percentiles, and how many were still alive at the end.
+#
+# Usage:
+#   python3 testStorm.py [host] [port] [connections] [hold_seconds]
+
+import asyncio
+import resource
+import sys
+import time
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def storm_bus(host, port, index, hold_event, results):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=30)
+    except Exception as e:
+        results["failed"] += 1
+        results["errors"][type(e).__name__] = results["errors"].get(type(e).__name__, 0) + 1
+        return
+    results["latencies"].append(time.perf_counter() - start)
+
+    try:
+        writer.write(f"HELLO BUS:storm-{index}\n".encode('utf-8'))
+        await writer.drain()
+        await hold_event.wait()
+
+        # A closed connection reads EOF immediately; a live one times out.
+        try:
+            data = await asyncio.wait_for(reader.read(1024), timeout=0.05)
+            if data:
+                results["alive"] += 1
+            else:
+                results["dropped"] += 1
+        except asyncio.TimeoutError:
+            results["alive"] += 1
+    except Exception:
+        results["dropped"] += 1
+    finally:
+        writer.close()
+
+
+async def run_storm(host, port, connections, hold_seconds):
+    results = {"latencies": [], "failed": 0, "alive": 0, "dropped": 0, "errors": {}}
+    hold_event = asyncio.Event()
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(storm_bus(host, port, i, hold_event, results)) for i in range(connections)]
+    while len(results["latencies"]) + results["failed"] < connections:
+        await asyncio.sleep(0.05)
+    storm_time = time.perf_counter() - start
+
+    await asyncio.sleep(hold_seconds)
+    hold_event.set()
+    await asyncio.gather(*tasks)
+    return results, storm_time
+
+
+def main():
+    host = sys.argv[1] if len(sys.argv) > 1 else "100.81.26.99"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 9999
+    connections = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+    hold_seconds = float(sys.argv[4]) if len(sys.argv) > 4 else 5.0
+
+    # Each simulated bus needs its own file descriptor.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < connections + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, connections + 64), hard))
+
+    print(f"🌩️ Opening {connections} connections to {host}:{port} ...")
+    results, storm_time = asyncio.run(run_storm(host, port, connections, hold_seconds))
+
+    connected = len(results["latencies"])
+    print(f"✅ Connected: {connected}/{connections} in {storm_time:.2f}s "
+          f"({connected / storm_time if storm_time else 0:.0f} conn/s)")
+    print(f"⏱️ Connect latency p50={percentile(results['latencies'], 50) * 1000:.1f}ms "
+          f"p99={percentile(results['latencies'], 99) * 1000:.1f}ms "
+          f"max={max(results['latencies'], default=0) * 1000:.1f}ms")
+    print(f"🔗 Still alive after {hold_seconds:.0f}s hold: {results['alive']} (dropped: {results['dropped']})")
+    if results["failed"]:
+        print(f"❌ Failed connects: {results['failed']} {results['errors']}")
+
+    sys.exit(0 if results["failed"] == 0 and results["dropped"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,11 @@
 # - pyserial library (`pip install pyserial`)
 # - binascii library 
 # - time library
+# - struct library
+# - collections library
+# - sqlite3 library
+# - random library
+# - zlib library
 # 
 # License:
 # MIT License (see below)
@@ -48,6 +53,108 @@ import time
 import socket 
 import select
 import threading
+import struct
+import collections
+import os
+import sqlite3
+import random
+import zlib
+
+# ------------------ WIRE PROTOCOL ------------------ #
+# WIRE_PROTOCOL is requested from the server in the HELLO BUS handshake.
+#   "BIN1" - compact length-prefixed binary events (~27 bytes per scan)
+#   "TEXT" - the original "RFID:... | STATUS:... | GPS: ..." lines (~100 bytes)
+# If the server does not answer with "WELCOME | PROTO:BIN1" (e.g. an older
+# server) the client falls back to TEXT automatically.
+#
+# BIN1 frame: [2-byte big-endian length][1-byte type][payload]
+#   type 0x01 EVENT: 12-byte EPC, 1 flag byte (bit 0 = ONBOARD),
+#                    GPS hour, minute, second (1 byte each),
+#                    latitude and longitude as int32 degrees * 1e7
+#   type 0x02 TEXT:  one UTF-8 control line (PONG, LOCATION, ...)
+
+WIRE_PROTOCOL = "BIN1"
+HANDSHAKE_TIMEOUT = 5
+FRAME_EVENT = 0x01
+FRAME_TEXT = 0x02
+FRAME_BATCH = 0x03
+FRAME_HEADER = struct.Struct(">HB")
+EVENT_STRUCT = struct.Struct(">12sBBBBii")
+BATCH_HEADER = struct.Struct(">IB")
+COORD_SCALE = 10_000_000
+
+# ------------------ UPLINK COMPRESSION ------------------ #
+# With UPLINK_COMPRESSION on, HELLO BUS also asks for "COMP:ZLIB". If the
+# server agrees (COMP:ZLIB in WELCOME) everything sent after WELCOME goes
+# through one zlib stream for the life of the connection, sync-flushed
+# after every write. The stream starts from COMPRESSION_DICT and keeps
+# its history between messages, so the repetitive tag/GPS payloads on the
+# metered LTE plan shrink well. COMPRESSION_DICT must be byte-for-byte
+# identical to the server's.
+
+UPLINK_COMPRESSION = True
+COMPRESSION_DICT = (
+    b"\xe2\x80\x68\x94\x00\x00\x00\x00"
+    b"LOCATION: PONG | UTC | 30.2, -92.0 BATCH:"
+    b"RFID:E2806894000 | STATUS:OFFBOARD | GPS: "
+    b"RFID:E2806894000 | STATUS:ONBOARD | GPS: "
+)
+
+# ------------------ EVENT BATCHING ------------------ #
+# Tag reads are not sent one by one. They are queued in an EventOutbox,
+# numbered with consecutive sequence numbers, and sent as one batch once
+# BATCH_MAX_EVENTS are waiting or the oldest has waited BATCH_MAX_DELAY
+# seconds, so a stop where 40 kids board costs a couple of radio wakeups
+# instead of 40. The server answers each batch with "ACK:<last_seq>";
+# events stay queued until acknowledged and, after a dropped connection,
+# only the unacknowledged tail is resent.
+#
+# Each outbox has a stream id that names its sequence numbers, so the
+# server can tell a reconnect (same stream, resume after the last ACK)
+# from a fresh start.
+#   BIN1 batch frame: type 0x03, uint32 first_seq, uint8 count, events
+#   TEXT batch:       "BATCH:<first_seq>:<count>" then <count> RFID lines
+#
+# A batch carries at most BATCH_LIMIT events, and at most MAX_IN_FLIGHT
+# events may be sent but unacknowledged at once. After a reconnect the
+# backlog therefore drains in large back-to-back batches.
+
+BATCH_MAX_EVENTS = 20
+BATCH_MAX_DELAY = 0.5
+BATCH_LIMIT = 200
+MAX_IN_FLIGHT = 1000
+
+# ------------------ STORE AND FORWARD ------------------ #
+# Every tag read is written to an on-disk spool on the Pi's SD card before
+# anything is sent. The spool is a SQLite database in WAL mode: an append
+# is one small sequential write to the WAL, with no fsync per scan
+# (synchronous=NORMAL). Events are deleted only when the server ACKs
+# them, so reads made while the LTE link is down, or before a reboot, are
+# replayed in order once the bus reconnects. The stream id and sequence
+# numbers live in the spool too and survive restarts. An event that
+# cannot be encoded for the wire (a malformed tag or GPS string) would
+# block everything queued behind it, so it is moved to the spool's
+# quarantine table, with the error, and the rest are sent.
+# Set SPOOL_PATH = None to keep the queue in memory only.
+
+SPOOL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "event_spool.db")
+
+# ------------------ RECONNECTING ------------------ #
+# After a lost connection the client waits a random time between 0 and
+# RECONNECT_BASE_DELAY * 2^attempt seconds (capped at RECONNECT_MAX_DELAY)
+# before trying again ("full jitter"), so a fleet that dropped off the
+# network together does not hit the server in lock step.
+# The server hands out a session TOKEN in every WELCOME. On reconnect the
+# client sends "RESUME:<token>" and is put back on its old registration,
+# protocol and ACK position; HELLO BUS is only sent if that fails.
+# The backoff only starts over once a connection is known to work: at a
+# WELCOME, or for servers that never send one, after the connection has
+# stayed up RECONNECT_STABLE_SECONDS. A server that accepts but does not
+# answer (a full backlog) keeps the delays growing.
+
+RECONNECT_BASE_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+RECONNECT_STABLE_SECONDS = 30
 
 # Def to read the GPS data from the receiver 
 def read_gps_data(gpsReceiver):
@@ -164,10 +271,377 @@ def read_rfid( scanner, startMarker = b'\xe2', expectedLength = 12):
 
 
 
+# Queue of tag reads waiting to be sent or acknowledged by the server.
+# The scan thread appends; the connection loop takes batches and applies ACKs.
+class EventOutbox:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = collections.deque()   # (seq, queued_at, rfid, state, gps), oldest first
+        self.stream_id = binascii.hexlify(os.urandom(4)).decode('utf-8')
+        self.session_token = None
+        self.next_seq = 1
+        self.sent_seq = 0
+        self.acked_seq = 0
+
+    def append(self, rfid_data, state, gps_data):
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self.events.append((seq, time.time(), rfid_data, state, gps_data))
+            return seq
+
+    def next_batch(self, max_events=BATCH_MAX_EVENTS, max_delay=BATCH_MAX_DELAY):
+        # Returns (first_seq, [(rfid, state, gps), ...]) when a batch is due, else None.
+        with self.lock:
+            start = next((i for i, event in enumerate(self.events) if event[0] > self.sent_seq), len(self.events))
+            unsent = len(self.events) - start
+            if unsent <= 0:
+                return None
+            if unsent < max_events and time.time() - self.events[start][1] < max_delay:
+                return None
+            # A batch stops at the gap left by a discarded event, as in EventSpool.
+            batch = [self.events[start]]
+            for i in range(start + 1, start + min(unsent, BATCH_LIMIT)):
+                if self.events[i][0] != batch[-1][0] + 1:
+                    break
+                batch.append(self.events[i])
+            self.sent_seq = batch[-1][0]
+            return batch[0][0], [(rfid, state, gps) for _, _, rfid, state, gps in batch]
+
+    def ack(self, seq):
+        with self.lock:
+            while self.events and self.events[0][0] <= seq:
+                self.events.popleft()
+            self.acked_seq = max(self.acked_seq, min(seq, self.next_seq - 1))
+            self.sent_seq = max(self.sent_seq, self.acked_seq)
+
+    def rewind(self):
+        # After a reconnect, everything past the last ACK has to be sent again.
+        with self.lock:
+            self.sent_seq = self.acked_seq
+
+    def unsend(self, first_seq):
+        # The batch from first_seq was taken but never sent.
+        with self.lock:
+            self.sent_seq = max(self.acked_seq, first_seq - 1)
+
+    def discard(self, seq, error):
+        # Drops an event that cannot be sent; kept in memory only, it is gone.
+        with self.lock:
+            self.events = collections.deque(event for event in self.events if event[0] != seq)
+
+    def in_flight(self):
+        with self.lock:
+            return self.sent_seq - self.acked_seq
+
+    def pending(self):
+        with self.lock:
+            return len(self.events)
+
+    def save_token(self, token):
+        self.session_token = token
+
+
+# Persistent version of EventOutbox backed by a SQLite WAL file.
+# Same methods, so start_client does not care which one it is given.
+class EventSpool:
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, queued_at REAL, rfid TEXT, state TEXT, gps TEXT)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS quarantine ("
+            "seq INTEGER PRIMARY KEY, queued_at REAL, rfid TEXT, state TEXT, gps TEXT, error TEXT)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        meta = dict(self.db.execute("SELECT key, value FROM meta"))
+        self.stream_id = meta.get("stream_id")
+        if not self.stream_id:
+            self.stream_id = binascii.hexlify(os.urandom(4)).decode('utf-8')
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('stream_id', ?)", (self.stream_id,))
+        self.session_token = meta.get("session_token")
+        self.acked_seq = int(meta.get("acked_seq", 0))
+        self.sent_seq = self.acked_seq
+
+    def append(self, rfid_data, state, gps_data):
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO events (queued_at, rfid, state, gps) VALUES (?, ?, ?, ?)",
+                (time.time(), rfid_data, state, gps_data)
+            )
+            return cursor.lastrowid
+
+    def next_batch(self, max_events=BATCH_MAX_EVENTS, max_delay=BATCH_MAX_DELAY):
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT seq, queued_at, rfid, state, gps FROM events WHERE seq > ? ORDER BY seq LIMIT ?",
+                (max(self.sent_seq, self.acked_seq), BATCH_LIMIT)
+            ).fetchall()
+            if not rows:
+                return None
+            if len(rows) < max_events and time.time() - rows[0][1] < max_delay:
+                return None
+            # The server numbers a batch's events first_seq, first_seq + 1, ...
+            # so a batch stops at any gap left by a rolled-back insert.
+            batch = [rows[0]]
+            for row in rows[1:]:
+                if row[0] != batch[-1][0] + 1:
+                    break
+                batch.append(row)
+            self.sent_seq = batch[-1][0]
+            return batch[0][0], [(rfid, state, gps) for _, _, rfid, state, gps in batch]
+
+    def ack(self, seq):
+        with self.lock:
+            if seq <= self.acked_seq:
+                return
+            self.db.execute("BEGIN")
+            self.db.execute("DELETE FROM events WHERE seq <= ?", (seq,))
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('acked_seq', ?)", (str(seq),))
+            self.db.execute("COMMIT")
+            self.acked_seq = seq
+            self.sent_seq = max(self.sent_seq, seq)
+
+    def rewind(self):
+        with self.lock:
+            self.sent_seq = self.acked_seq
+
+    def unsend(self, first_seq):
+        with self.lock:
+            self.sent_seq = max(self.acked_seq, first_seq - 1)
+
+    def discard(self, seq, error):
+        # Moves an event that cannot be sent to the quarantine table.
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.execute(
+                "INSERT OR REPLACE INTO quarantine SELECT seq, queued_at, rfid, state, gps, ? FROM events WHERE seq = ?",
+                (str(error), seq)
+            )
+            self.db.execute("DELETE FROM events WHERE seq = ?", (seq,))
+            self.db.execute("COMMIT")
+
+    def in_flight(self):
+        with self.lock:
+            return self.sent_seq - self.acked_seq
+
+    def pending(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def save_token(self, token):
+        with self.lock:
+            if token != self.session_token:
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('session_token', ?)", (token,))
+                self.session_token = token
+
+
+# Jittered exponential backoff between reconnect attempts.
+class ReconnectBackoff:
+
+    def __init__(self, base_delay=RECONNECT_BASE_DELAY, max_delay=RECONNECT_MAX_DELAY):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt = 0
+
+    def next_delay(self):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** self.attempt))
+        self.attempt += 1
+        return delay
+
+    def reset(self):
+        self.attempt = 0
+
+
+# Everything the client sends after WELCOME goes through an Uplink, which
+# applies the negotiated compression and counts bytes before and after it.
+class Uplink:
+
+    def __init__(self, client_socket, compression=None):
+        self.client_socket = client_socket
+        self.compressor = zlib.compressobj(zdict=COMPRESSION_DICT) if compression == "ZLIB" else None
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.events = 0
+
+    def sendall(self, data, events=0):
+        self.raw_bytes += len(data)
+        self.events += events
+        if self.compressor is not None:
+            data = self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.wire_bytes += len(data)
+        self.client_socket.sendall(data)
+
+    def usage(self):
+        if not self.events:
+            return "no events yet"
+        return (f"{self.raw_bytes / self.events:.1f} B/event raw → "
+                f"{self.wire_bytes / self.events:.1f} B/event on the wire")
+
+
+# Def to pack one tag read into the 24-byte BIN1 event payload
+def pack_event(rfid_data, state, gps_data):
+    gps_time, coords = gps_data.split(" | ")
+    hours, minutes, seconds = (int(x) for x in gps_time.replace("UTC", "").strip().split(":"))
+    lat, lon = (float(x) for x in coords.split(","))
+    return EVENT_STRUCT.pack(
+        bytes.fromhex(rfid_data),
+        1 if state == "onboard" else 0,
+        hours, minutes, seconds,
+        round(lat * COORD_SCALE), round(lon * COORD_SCALE),
+    )
+
+
+# Def to find the event of a batch that pack_event cannot encode.
+# Returns (seq, error), or None if every event packs.
+def find_unencodable(first_seq, events):
+    for seq, event in enumerate(events, first_seq):
+        try:
+            pack_event(*event)
+        except (ValueError, struct.error) as e:
+            return seq, e
+    return None
+
+
+# Def to encode a batch of events in the agreed protocol
+def encode_batch(first_seq, events, protocol):
+    if protocol == "BIN1":
+        payload = BATCH_HEADER.pack(first_seq, len(events)) + b"".join(pack_event(*e) for e in events)
+        return FRAME_HEADER.pack(len(payload) + 1, FRAME_BATCH) + payload
+    lines = [f"BATCH:{first_seq}:{len(events)}"] + [format_event(*e) for e in events]
+    return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+# Def to build one BIN1 event frame from a tag read and the GPS string
+# returned by parse_gpgga ("HH:MM:SS UTC | lat, lon").
+def encode_event(rfid_data, state, gps_data):
+    payload = pack_event(rfid_data, state, gps_data)
+    return FRAME_HEADER.pack(len(payload) + 1, FRAME_EVENT) + payload
+
+
+# Def to build the text form of a tag read (also the TEXT protocol fallback)
+def format_event(rfid_data, state, gps_data):
+    return f"RFID:{rfid_data} | STATUS:{state.upper()} | GPS: {gps_data}"
+
+
+# Def to send a control line (PONG, LOCATION, ...) in the agreed protocol
+def send_line(uplink, line, protocol):
+    if protocol == "BIN1":
+        payload = line.encode('utf-8')
+        uplink.sendall(FRAME_HEADER.pack(len(payload) + 1, FRAME_TEXT) + payload)
+    else:
+        uplink.sendall((line + "\n").encode('utf-8'))
+
+
+# Def to split newline-terminated server commands out of a receive buffer.
+# Returns the complete lines and whatever partial line is left over.
+def split_lines(buffer):
+    *lines, rest = buffer.split(b"\n")
+    return [line.decode('utf-8', errors='ignore').strip() for line in lines], rest
+
+
+# Def to read one reply line from the server during the handshake.
+# Returns the line (or None on timeout) and whatever bytes followed it.
+def read_reply(client_socket, buffer):
+    deadline = time.time() + HANDSHAKE_TIMEOUT
+    while b"\n" not in buffer and time.time() < deadline:
+        readable, _, _ = select.select([client_socket], [], [], 0.1)
+        if readable:
+            data = client_socket.recv(1024)
+            if not data:
+                raise ConnectionError("server closed during handshake")
+            buffer += data
+
+    if b"\n" not in buffer:
+        return None, buffer
+    line, rest = buffer.split(b"\n", 1)
+    return line.decode('utf-8', errors='ignore').strip(), rest
+
+
+# Def to open a session with the server: resume the previous one if we
+# hold a token, otherwise register with HELLO BUS and negotiate the wire
+# protocol and compression. Returns the agreed protocol, the last
+# sequence number the server has acknowledged for this stream, the
+# uplink compression (or None), and any bytes received after WELCOME.
+def open_session(client_socket, bus_id, outbox):
+    buffer = b""
+    if outbox.session_token:
+        client_socket.sendall(f"RESUME:{outbox.session_token}\n".encode('utf-8'))
+        reply, buffer = read_reply(client_socket, buffer)
+        if reply and reply.startswith("WELCOME"):
+            print("🔁 Resumed previous session")
+            return parse_welcome(reply, outbox) + (buffer, True)
+
+    hello = f"HELLO BUS:{bus_id} | PROTO:{WIRE_PROTOCOL} | STREAM:{outbox.stream_id} | REQID:1"
+    if UPLINK_COMPRESSION:
+        hello += " | COMP:ZLIB"
+    client_socket.sendall((hello + "\n").encode('utf-8'))
+    reply, buffer = read_reply(client_socket, buffer)
+    if reply and reply.startswith("WELCOME"):
+        return parse_welcome(reply, outbox) + (buffer, True)
+    # Older servers do not answer HELLO; keep whatever arrived for the command loop.
+    return "TEXT", 0, None, (reply.encode('utf-8') + b"\n" + buffer) if reply else buffer, False
+
+
+# Def for the first field of a reply: "PONG:<id>" when the server sent a request id.
+def reply_head(kind, request_id):
+    return f"{kind}:{request_id}" if request_id else kind
+
+
+# Def to read "WELCOME | PROTO:<name> | ACK:<seq> | TOKEN:<token>[ | COMP:ZLIB]"
+def parse_welcome(reply, outbox):
+    options = dict(f.strip().split(":", 1) for f in reply.split(" | ")[1:] if ":" in f)
+    if options.get("TOKEN"):
+        outbox.save_token(options["TOKEN"])
+    protocol = "BIN1" if options.get("PROTO") == "BIN1" else "TEXT"
+    compression = "ZLIB" if options.get("COMP") == "ZLIB" else None
+    try:
+        acked = int(options.get("ACK", 0))
+    except ValueError:
+        raise ConnectionError(f"malformed WELCOME: {reply}")
+    return protocol, acked, compression
+
+
+# Def for the scan thread. Runs for the life of the program, connected or
+# not, and only writes to the outbox/spool; start_client does the sending.
+def scan_loop(scanner, gpsReceiver, outbox, stop_event):
+    print("[🧵 SCAN THREAD STARTED]")
+    recent_tags = {}
+    tag_state = {}
+    cooldown = 5
+    while not stop_event.is_set():
+        try:
+            rfid_data = read_rfid(scanner)
+            gps_data = read_gps_data(gpsReceiver)
+            now = time.time()
+
+            if rfid_data and gps_data:
+                last_seen = recent_tags.get(rfid_data, 0)
+                if (now - last_seen) > cooldown:
+                    current_state = tag_state.get(rfid_data, "offboard")
+                    new_state = "onboard" if current_state == "offboard" else "offboard"
+                    tag_state[rfid_data] = new_state
+                    recent_tags[rfid_data] = now
+
+                    seq = outbox.append(rfid_data, new_state, gps_data)
+                    print(f"📥 Queued #{seq}: {format_event(rfid_data, new_state, gps_data)}")
+        except Exception as e:
+            print(f"[SCAN ERROR] {e}")
+        time.sleep(0.1)
+
+
 # Def for client 
 
 
-def start_client(scanner, gpsReceiver):
+def start_client(gpsReceiver, outbox, backoff):
     client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     host = "100.81.26.99"
     port = 9999
@@ -175,61 +649,79 @@ def start_client(scanner, gpsReceiver):
     try:
         client_socket.connect((host, port))
         bus_id = "Fish"
-        client_socket.sendall(f"HELLO BUS:{bus_id}\n".encode('utf-8'))
-        print("✅ Connected and registered as Fish")
-
-        recent_tags = {}
-        tag_state = {}
-        cooldown = 5
-        stop_event = threading.Event()
-
-        def scan_loop():
-            print("[🧵 SCAN THREAD STARTED]")
-            while not stop_event.is_set():
-                try:
-                    rfid_data = read_rfid(scanner)
-                    gps_data = read_gps_data(gpsReceiver)
-                    now = time.time()
-
-                    if rfid_data and gps_data:
-                        last_seen = recent_tags.get(rfid_data, 0)
-                        if (now - last_seen) > cooldown:
-                            current_state = tag_state.get(rfid_data, "offboard")
-                            new_state = "onboard" if current_state == "offboard" else "offboard"
-                            tag_state[rfid_data] = new_state
-                            recent_tags[rfid_data] = now
-
-                            transmission = f"RFID:{rfid_data} | STATUS:{new_state.upper()} | GPS: {gps_data}"
-                            client_socket.sendall((transmission + '\n').encode('utf-8'))
-                            print(f"📡 Sent: {transmission}")
-                except Exception as e:
-                    print(f"[SCAN ERROR] {e}")
-                time.sleep(0.1)
-
-        threading.Thread(target=scan_loop, daemon=True).start()
+        protocol, acked_seq, compression, command_buffer, welcomed = open_session(client_socket, bus_id, outbox)
+        uplink = Uplink(client_socket, compression)
+        outbox.ack(acked_seq)
+        outbox.rewind()
+        proven = welcomed
+        if proven:
+            backoff.reset()
+        connected_at = time.monotonic()
+        print(f"✅ Connected and registered as {bus_id} ({protocol}, "
+              f"compression {compression or 'off'}, {outbox.pending()} queued event(s) to send)")
 
         while True:
+            if not proven and time.monotonic() - connected_at >= RECONNECT_STABLE_SECONDS:
+                backoff.reset()
+                proven = True
             readable, _, _ = select.select([client_socket], [], [], 0.1)
             if readable:
-                server_command = client_socket.recv(1024).decode('utf-8').strip()
-                if server_command == "PING":
+                data = client_socket.recv(1024)
+                if not data:
+                    print("❗ Server closed the connection")
+                    break
+                command_buffer += data
+            server_commands, command_buffer = split_lines(command_buffer)
+            for server_command in server_commands:
+                if server_command.startswith("ACK:"):
+                    try:
+                        acked = int(server_command[4:])
+                    except ValueError:
+                        raise ConnectionError(f"malformed ACK: {server_command}")
+                    outbox.ack(acked)
+                    continue
+                # Requests may carry an id ("PING:<id>") to echo in the reply.
+                command, _, request_id = server_command.partition(":")
+                if command == "PING":
                     gps_data = read_gps_data(gpsReceiver)
                     timestamp = time.strftime("%H:%M:%S")
-                    response = f"PONG | {timestamp} | {gps_data}"
-                    client_socket.sendall((response + "\n").encode('utf-8'))
+                    response = f"{reply_head('PONG', request_id)} | {timestamp} | {gps_data}"
+                    send_line(uplink, response, protocol)
                     print(f"🛰️ Responded to PING: {response}")
-                elif server_command == "GET_LOCATION":
+                elif command == "GET_LOCATION":
                     gps_data = read_gps_data(gpsReceiver)
-                    response = f"LOCATION: {gps_data}"
-                    client_socket.sendall((response + "\n").encode('utf-8'))
+                    if request_id:
+                        response = f"{reply_head('LOCATION', request_id)} | {gps_data}"
+                    else:
+                        response = f"LOCATION: {gps_data}"
+                    send_line(uplink, response, protocol)
                     print(f"📍 Sent location: {response}")
 
-    except KeyboardInterrupt:
-        stop_event.set()
-        print("🛑 Client exiting...")
-        scanner.close()
-        gpsReceiver.close()
-        client_socket.close()
+            # Send every batch that is due, up to the in-flight window.
+            while outbox.in_flight() < MAX_IN_FLIGHT:
+                batch = outbox.next_batch()
+                if not batch:
+                    break
+                first_seq, events = batch
+                try:
+                    data = encode_batch(first_seq, events, protocol)
+                except (ValueError, struct.error) as e:
+                    # One bad event must not hold up the rest: set it aside and
+                    # take the batch again without it.
+                    seq, error = find_unencodable(first_seq, events) or (first_seq, e)
+                    outbox.unsend(first_seq)
+                    outbox.discard(seq, error)
+                    print(f"🗑️ Set aside event #{seq}, it cannot be encoded: {error}")
+                    continue
+                uplink.sendall(data, events=len(events))
+                print(f"📡 Sent batch #{first_seq}-#{first_seq + len(events) - 1} "
+                      f"({len(events)} event(s), {uplink.usage()})")
+
+    except OSError as e:
+        print(f"❗ Connection lost: {e}")
+
+    # Unacknowledged events stay in the outbox and are resent after reconnecting.
+    client_socket.close()
 
 
 ### Main ###
@@ -268,8 +760,24 @@ if __name__ == "__main__":
 # but I decided to still declare them within the code.
 # I am also testing this on Ubuntu 24.04.
 
-    while True: 
-        start_client(scanner, gpsReceiver)
-        time.sleep(3)
+    outbox = EventSpool(SPOOL_PATH) if SPOOL_PATH else EventOutbox()
+    print(f"💾 {outbox.pending()} unsent event(s) waiting in the spool")
+
+    stop_event = threading.Event()
+    threading.Thread(target=scan_loop, args=(scanner, gpsReceiver, outbox, stop_event), daemon=True).start()
+
+    backoff = ReconnectBackoff()
+
+    try:
+        while True: 
+            start_client(gpsReceiver, outbox, backoff)
+            delay = backoff.next_delay()
+            print(f"⏳ Reconnecting in {delay:.1f}s")
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        stop_event.set()
+        print("🛑 Client exiting...")
+        scanner.close()
+        gpsReceiver.close()
 
 
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Bulk student import and export for the bus server's database.
+#
+# import reads students from a CSV file (header row with name, rfid_tag,
+# Bus_ID, school) or a JSONL file (one object per line with those keys)
+# and inserts them with executemany, --chunk rows per statement, all in
+# one transaction: either the whole file loads or nothing does. The file
+# is streamed, never held in memory. Duplicate RFID tags are found in the
+# same pass, against a set of the tags already in the table and the tags
+# seen earlier in the file. They are skipped and reported with their line
+# numbers, or, with --update, replace the existing student's details.
+# --strict rolls everything back at the first duplicate or invalid row.
+#
+# export streams the table, ordered by name, to CSV or JSONL through an
+# unbuffered server-side cursor, so memory stays flat however many
+# students there are.
+#
+# A running server sees imported students at its next roster refresh
+# (ROSTER_REFRESH_SECONDS).
+#
+# Connection settings default to the server's connect(); use --mysql to
+# point somewhere else.
+#
+# Usage:
+#   python3 bulkStudents.py import district.csv [--chunk 1000] [--update] [--strict]
+#   python3 bulkStudents.py export students.jsonl [--format jsonl]
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+import pymysql
+
+from migrate import connect
+
+COLUMNS = ("name", "rfid_tag", "Bus_ID", "school")
+
+INSERT_STUDENTS = "INSERT INTO students (name, rfid_tag, Bus_ID, school) VALUES (%s, %s, %s, %s)"
+UPSERT_STUDENTS = INSERT_STUDENTS + (
+    " ON DUPLICATE KEY UPDATE name = VALUES(name), Bus_ID = VALUES(Bus_ID), school = VALUES(school)"
+)
+
+
+class ImportStats:
+
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.duplicates_in_file = 0
+        self.duplicates_in_table = 0
+        self.invalid = 0
+
+
+class ImportAborted(Exception):
+    pass
+
+
+def file_format(path, requested):
+    if requested:
+        return requested
+    return "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+
+
+# --------------- IMPORT --------------- #
+
+def read_students(f, fmt):
+    # Yields (line_number, record dict or None if unparseable).
+    if fmt == "csv":
+        reader = csv.DictReader(f)
+        missing = [column for column in COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ImportAborted(f"CSV header is missing column(s): {', '.join(missing)}")
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else None
+
+
+def clean_student(record):
+    # Returns (name, rfid_tag, Bus_ID, school), or None if name or tag is missing.
+    if record is None:
+        return None
+    student = tuple(str(record.get(column) or "").strip() for column in COLUMNS)
+    if not student[0] or not student[1]:
+        return None
+    return student
+
+
+def existing_tags(conn):
+    with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+        cursor.execute("SELECT rfid_tag FROM students")
+        return {rfid for (rfid,) in cursor}
+
+
+def import_students(conn, f, fmt, chunk, update, strict):
+    stats = ImportStats()
+    known = existing_tags(conn)
+    seen = set()
+    statement = UPSERT_STUDENTS if update else INSERT_STUDENTS
+    batch = []
+
+    def problem(message):
+        print(f"⚠️ {message}")
+        if strict:
+            raise ImportAborted(message)
+
+    conn.begin()
+    try:
+        with conn.cursor() as cursor:
+            for line_number, record in read_students(f, fmt):
+                stats.read += 1
+                student = clean_student(record)
+                if student is None:
+                    stats.invalid += 1
+                    problem(f"line {line_number}: needs a name and an rfid_tag")
+                    continue
+                rfid = student[1]
+                if rfid in seen:
+                    stats.duplicates_in_file += 1
+                    problem(f"line {line_number}: RFID {rfid} already appears earlier in the file")
+                    continue
+                seen.add(rfid)
+                if rfid in known:
+                    if not update:
+                        stats.duplicates_in_table += 1
+                        problem(f"line {line_number}: RFID {rfid} is already registered")
+                        continue
+                    stats.updated += 1
+                else:
+                    stats.inserted += 1
+                batch.append(student)
+                if len(batch) >= chunk:
+                    cursor.executemany(statement, batch)
+                    batch = []
+            if batch:
+                cursor.executemany(statement, batch)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return stats
+
+
+# --------------- EXPORT --------------- #
+
+def export_students(conn, f, fmt):
+    count = 0
+    writer = csv.writer(f) if fmt == "csv" else None
+    if writer:
+        writer.writerow(COLUMNS)
+    with conn.cursor(pymysql.cursors.SSCursor) as cursor:
+        cursor.execute("SELECT name, rfid_tag, Bus_ID, school FROM students ORDER BY name")
+        for row in cursor:
+            if writer:
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import or export the students table.")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help="CSV or JSONL file; - for stdin/stdout")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="default: from the file extension")
+    parser.add_argument("--chunk", type=int, default=1000, help="rows per executemany INSERT")
+    parser.add_argument("--update", action="store_true", help="update students whose RFID is already registered")
+    parser.add_argument("--strict", action="store_true", help="roll back at the first duplicate or invalid row")
+    parser.add_argument("--mysql", help="user:password@host/database (default: the server's connect())")
+    args = parser.parse_args()
+
+    fmt = file_format(args.path, args.format)
+    conn = connect(args.mysql)
+    start = time.perf_counter()
+    try:
+        if args.command == "import":
+            f = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+            try:
+                stats = import_students(conn, f, fmt, max(1, args.chunk), args.update, args.strict)
+            except ImportAborted as e:
+                sys.exit(f"❌ Import rolled back: {e}")
+            finally:
+                if f is not sys.stdin:
+                    f.close()
+            elapsed = time.perf_counter() - start
+            print(f"✅ Read {stats.read} row(s) in {elapsed:.2f}s ({stats.read / elapsed if elapsed else 0:.0f} rows/s): "
+                  f"{stats.inserted} inserted, {stats.updated} updated, "
+                  f"{stats.duplicates_in_file + stats.duplicates_in_table} duplicate(s) skipped "
+                  f"({stats.duplicates_in_file} within the file, {stats.duplicates_in_table} already registered), "
+                  f"{stats.invalid} invalid")
+        else:
+            f = sys.stdout if args.path == "-" else open(args.path, "w", newline="", encoding="utf-8")
+            try:
+                count = export_students(conn, f, fmt)
+            finally:
+                if f is not sys.stdout:
+                    f.close()
+            elapsed = time.perf_counter() - start
+            print(f"✅ Exported {count} student(s) in {elapsed:.2f}s", file=sys.stderr)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
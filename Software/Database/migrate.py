@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+
+# Schema migrations for the bus server's MySQL database.
+#
+# Migrations are the numbered files in migrations/ next to this script
+# (NNNN_description.sql), applied in order. Each applied version is
+# recorded in a schema_migrations table with a checksum of its file, so a
+# rerun only applies new files, and an applied file that was edited
+# afterwards is reported.
+#
+# MySQL commits each DDL statement as it runs, so a migration cannot be
+# rolled back halfway. Instead a rerun after a failure is safe: a table or
+# index that already exists is reported and skipped. The same rule lets
+# deployments whose students table was created by hand adopt the
+# migrations without dropping anything.
+#
+# Commands:
+#   status  list the migrations and whether each one is applied
+#   up      apply pending migrations (the default), or up to --to VERSION
+#   check   EXPLAIN the server's hot queries and fail (exit 1) unless each
+#           one uses the index meant for it
+#
+# Connection settings default to the server's connect(); use --mysql to
+# point somewhere else.
+#
+# Usage:
+#   python3 migrate.py [status|up|check] [--to 3] [--mysql user:password@host/database]
+
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+from datetime import datetime
+
+import pymysql
+
+SOFTWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_PATH = os.path.join(SOFTWARE_DIR, "Server", "v2.0.0-20250417-alpha.py")
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_NAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+SCHEMA_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT UNSIGNED NOT NULL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# MySQL errors meaning the statement's change is already in place.
+ALREADY_APPLIED = {
+    1050: "table already exists",
+    1060: "column already exists",
+    1061: "index already exists",
+}
+DUPLICATE_ENTRY = 1062
+
+# (description, query, sample values for its parameters, index it must use).
+# The queries are the server's own SQL (SQLStorage), so keep them in step.
+HOT_QUERIES = (
+    ("student by RFID tag", "SELECT name FROM students WHERE rfid_tag = %s", ("rfid_tag",), "uq_students_rfid_tag"),
+    ("student by name", "SELECT * FROM students WHERE name = %s", ("name",), "idx_students_name"),
+    ("RFID tags by name", "SELECT rfid_tag FROM students WHERE name = %s", ("name",), "idx_students_name"),
+    ("student list page",
+     "SELECT name, id, school FROM students WHERE (name > %s OR (name = %s AND id > %s)) "
+     "ORDER BY name, id LIMIT 201",
+     ("name", "name", "id"), "idx_students_name"),
+    ("bus roll page",
+     "SELECT name, id FROM students WHERE Bus_ID = %s AND (name > %s OR (name = %s AND id > %s)) "
+     "ORDER BY name, id LIMIT 201",
+     ("Bus_ID", "name", "name", "id"), "idx_students_bus_name"),
+    ("attendance since midnight (onboard state restore)",
+     "SELECT Bus_ID, rfid_tag, status, gps, logged_at FROM attendance WHERE logged_at >= %s ORDER BY logged_at, id",
+     ("midnight",), "idx_attendance_logged_at"),
+)
+
+
+class Migration:
+    """One numbered .sql file from the migrations directory"""
+
+    def __init__(self, path):
+        match = MIGRATION_NAME.match(os.path.basename(path))
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        self.path = path
+        with open(path, "rb") as f:
+            data = f.read()
+        self.checksum = hashlib.sha256(data).hexdigest()
+        self.statements = split_statements(data.decode("utf-8"))
+
+
+def split_statements(text):
+    # Statements end with ";"; lines starting with "--" are comments.
+    lines = [line for line in text.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def load_migrations():
+    migrations = [
+        Migration(os.path.join(MIGRATIONS_DIR, filename))
+        for filename in os.listdir(MIGRATIONS_DIR)
+        if MIGRATION_NAME.match(filename)
+    ]
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        sys.exit(f"❌ Two migration files share a version number: {versions}")
+    return migrations
+
+
+def connect(dsn):
+    if not dsn:
+        spec = importlib.util.spec_from_file_location("bus_server", SERVER_PATH)
+        server = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(server)
+        return server.connect()
+    credentials, _, location = dsn.rpartition("@")
+    user, _, password = credentials.partition(":")
+    host, _, database = location.partition("/")
+    return pymysql.connect(host=host, user=user, password=password, database=database, autocommit=True)
+
+
+def applied_versions(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(SCHEMA_MIGRATIONS_TABLE)
+        cursor.execute("SELECT version, checksum FROM schema_migrations")
+        return dict(cursor.fetchall())
+
+
+# --------------- COMMANDS --------------- #
+
+def show_status(conn, migrations):
+    applied = applied_versions(conn)
+    for migration in migrations:
+        if migration.version not in applied:
+            state = "pending"
+        elif applied[migration.version] != migration.checksum:
+            state = "applied, file changed since"
+        else:
+            state = "applied"
+        print(f"{migration.version:04d} {migration.name:<32} {state}")
+    unknown = sorted(set(applied) - {migration.version for migration in migrations})
+    if unknown:
+        print(f"⚠️ Applied versions with no migration file: {unknown}")
+
+
+def migrate_up(conn, migrations, target):
+    applied = applied_versions(conn)
+    pending = [m for m in migrations if m.version not in applied and (target is None or m.version <= target)]
+    for migration in migrations:
+        if migration.version in applied and applied[migration.version] != migration.checksum:
+            print(f"⚠️ {migration.version:04d}_{migration.name} was edited after it was applied")
+    if not pending:
+        print("✅ Schema is up to date")
+        return True
+
+    with conn.cursor() as cursor:
+        for migration in pending:
+            print(f"⬆️ {migration.version:04d}_{migration.name}")
+            for statement in migration.statements:
+                try:
+                    cursor.execute(statement)
+                except pymysql.err.MySQLError as e:
+                    code = e.args[0] if e.args else None
+                    if code in ALREADY_APPLIED:
+                        print(f"   ↪️ skipped, {ALREADY_APPLIED[code]}: {first_line(statement)}")
+                        continue
+                    print(f"❌ {migration.version:04d}_{migration.name} failed: {e}")
+                    print(f"   in: {first_line(statement)}")
+                    if code == DUPLICATE_ENTRY and "students" in statement:
+                        report_duplicate_tags(cursor)
+                    return False
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum)
+            )
+            conn.commit()
+    print(f"✅ Applied {len(pending)} migration(s)")
+    return True
+
+
+def first_line(statement):
+    return statement.splitlines()[0]
+
+
+def report_duplicate_tags(cursor):
+    cursor.execute(
+        "SELECT rfid_tag, COUNT(*), GROUP_CONCAT(name SEPARATOR ', ') FROM students "
+        "GROUP BY rfid_tag HAVING COUNT(*) > 1 ORDER BY COUNT(*) DESC LIMIT 20"
+    )
+    print("   RFID tags assigned to more than one student (fix these, then rerun):")
+    for rfid, count, names in cursor.fetchall():
+        print(f"   - {rfid}: {count} students ({names})")
+
+
+def check_queries(conn):
+    # A unique-key lookup that finds nothing is resolved while planning, so
+    # EXPLAIN reports no key; its Extra text says so and counts as a pass.
+    samples = sample_values(conn)
+    failed = 0
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        for description, query, params, index in HOT_QUERIES:
+            try:
+                cursor.execute("EXPLAIN " + query, tuple(samples.get(param, "X") for param in params))
+                plan = cursor.fetchall()
+            except pymysql.err.MySQLError as e:
+                print(f"❌ {description}: {e}")
+                failed += 1
+                continue
+            row = plan[0]
+            extra = row.get("Extra") or ""
+            if row.get("key") == index:
+                print(f"✅ {description}: {index} ({row.get('type')}, ~{row.get('rows')} row(s))")
+            elif "const table" in extra:
+                print(f"✅ {description}: unique lookup ({extra})")
+            else:
+                print(f"❌ {description}: expected {index}, plan uses {row.get('key') or 'no index'} "
+                      f"({row.get('type')}, ~{row.get('rows')} row(s)) {extra}")
+                failed += 1
+    return failed == 0
+
+
+def sample_values(conn):
+    # EXPLAIN a real row's values when there is one, and today's midnight
+    # as load_onboard_state passes it.
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SELECT rfid_tag, Bus_ID, name, id FROM students LIMIT 1")
+            row = cursor.fetchone()
+        except pymysql.err.MySQLError:
+            row = None
+    samples = dict(zip(("rfid_tag", "Bus_ID", "name", "id"), row)) if row else {"id": 0}
+    samples["midnight"] = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and upgrade the bus server's MySQL schema.")
+    parser.add_argument("command", nargs="?", choices=("status", "up", "check"), default="up")
+    parser.add_argument("--to", type=int, help="with up, stop after this migration version")
+    parser.add_argument("--mysql", help="user:password@host/database (default: the server's connect())")
+    args = parser.parse_args()
+
+    migrations = load_migrations()
+    conn = connect(args.mysql)
+    try:
+        if args.command == "status":
+            show_status(conn, migrations)
+            ok = True
+        elif args.command == "up":
+            ok = migrate_up(conn, migrations, args.to)
+        else:
+            ok = check_queries(conn)
+    finally:
+        conn.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+-- Student roster: one row per RFID card, read by the server at startup
+-- (roster cache) and edited from the admin menu.
+-- Deployments that created this table by hand keep their table; the
+-- indexes are added in 0002.
+
+CREATE TABLE IF NOT EXISTS students (
+    id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    rfid_tag VARCHAR(64) NOT NULL,
+    Bus_ID VARCHAR(64) NOT NULL,
+    school VARCHAR(255) NOT NULL
+);
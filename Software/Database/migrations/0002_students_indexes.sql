@@ -0,0 +1,11 @@
+-- Indexes for the server's student queries:
+--   WHERE rfid_tag = %s     roster refresh, duplicate cards on add_student
+--   WHERE Bus_ID = %s       bus_roll_query (covers the selected name)
+--   WHERE name = %s         search_student, delete_student
+--   ORDER BY name           view_all_students
+-- The unique index fails if the table already holds duplicate RFID tags;
+-- migrate.py lists them so they can be fixed before rerunning.
+
+ALTER TABLE students ADD UNIQUE INDEX uq_students_rfid_tag (rfid_tag);
+ALTER TABLE students ADD INDEX idx_students_bus_name (Bus_ID, name);
+ALTER TABLE students ADD INDEX idx_students_name (name);
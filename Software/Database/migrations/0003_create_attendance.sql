@@ -0,0 +1,15 @@
+-- Attendance events written in batches by the server's AttendanceWriter,
+-- queried by time, by bus and by student card.
+
+CREATE TABLE IF NOT EXISTS attendance (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    logged_at DATETIME NOT NULL,
+    rfid_tag VARCHAR(64) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    Bus_ID VARCHAR(64),
+    status VARCHAR(16) NOT NULL,
+    gps VARCHAR(128),
+    INDEX idx_attendance_logged_at (logged_at),
+    INDEX idx_attendance_bus (Bus_ID, logged_at),
+    INDEX idx_attendance_rfid (rfid_tag, logged_at)
+);
@@ -12,9 +12,9 @@
 # Description:
 # # This software functions as the main server for the Schoolbus Automation system. It listens
 # for connections from bus-mounted clients over TCP, processes incoming RFID and
-# GPS data, logs student attendance, and stores records in a MySQL database. It
-# also provides a text-based admin interface for managing students, querying logs,
-# and interacting with connected buses.
+# GPS data, logs student attendance, and stores records in a MySQL (or embedded
+# SQLite) database. It also provides a text-based admin interface for managing
+# students, querying logs, and interacting with connected buses.
 
 # Dependencies:
 # - Python 3.x
@@ -23,10 +23,24 @@
 # - time library
 # - curses library
 # - threading library
-# - queue library
+# - collections library
 # - socket library
 # - pymysql library
 # - os library
+# - asyncio library
+# - resource library
+# - struct library
+# - secrets library
+# - zlib library
+# - itertools library
+# - queue library
+# - multiprocessing library
+# - concurrent.futures library
+# - http.server library
+# - bisect library
+# - math library
+# - sqlite3 library
+# - difflib library
 # 
 # License:
 # MIT License (see below)
@@ -51,96 +65,1847 @@
 
 import curses
 import threading
-import queue
+import collections
 import socket
+import asyncio
+import resource
+import struct
+import secrets
+import zlib
+import itertools
+import queue
+import multiprocessing
+import concurrent.futures
+from multiprocessing.managers import BaseManager
+import http.server
+import bisect
+import math
+import sqlite3
+import difflib
 import pymysql
 import time
 import os
 from datetime import datetime
 from wcwidth import wcswidth  # For accurate emoji and wide character rendering
 
+# ------------------ LOG PIPELINE ------------------ #
+# Every thread logs with server_logs.put(message, level), the level being
+# one of LOG_LEVELS (LOG_INFO if left out). Messages go into a bounded ring
+# buffer that the curses UI reads the tail of, so producers never wait on
+# the UI. When it is full the oldest line is dropped (and counted), so a
+# stalled UI, e.g. one waiting in add_student's getstr(), costs at most
+# LOG_CAPACITY lines of memory. The UI colours each line by its level and
+# shows only lines at LOG_DISPLAY_LEVEL or above. Appends take no lock:
+# deque.append and next() on the sequence counter are atomic.
+
+LOG_CAPACITY = 1000
+
+LOG_INFO = "info"
+LOG_OK = "ok"
+LOG_WARNING = "warning"
+LOG_ERROR = "error"
+LOG_LEVELS = (LOG_INFO, LOG_OK, LOG_WARNING, LOG_ERROR)    # least to most severe
+
+LOG_DISPLAY_LEVEL = LOG_INFO    # LOG_WARNING hides routine traffic from the log pane
+
+
+class LogBuffer:
+    """Bounded, drop-oldest buffer of (sequence, level, message) log lines"""
+
+    def __init__(self, capacity):
+        self.lines = collections.deque(maxlen=capacity)
+        self.sequence = itertools.count()
+
+    def put(self, message, level=LOG_INFO):
+        self.lines.append((next(self.sequence), level, message))
+
+    def tail(self, count, level=LOG_INFO):
+        # The last `count` lines at `level` or above. Copying the deque in
+        # one C call is safe against concurrent appends.
+        if count <= 0:
+            return []
+        lines = list(self.lines)
+        if level != LOG_INFO:
+            shown = LOG_LEVELS[LOG_LEVELS.index(level):]
+            lines = [line for line in lines if line[1] in shown]
+        return lines[-count:]
+
+    def qsize(self):
+        return len(self.lines)
+
+    def dropped(self):
+        # Lines written minus lines still held.
+        try:
+            newest = self.lines[-1][0]
+        except IndexError:
+            return 0
+        return max(0, newest + 1 - len(self.lines))
+
+
 # ------------------ GLOBAL VARIABLES ------------------ #
-server_logs = queue.Queue()
-LOG_HISTORY = []
+server_logs = LogBuffer(LOG_CAPACITY)
 MAX_LOG_LINES = 25
 DEBOUNCE_SECONDS = 5
-rfid_timestamps = {}
-client_bus_map = {}  # IP to Bus ID 
+
+# ------------------ SERVER SETTINGS ------------------ #
+# SERVER_MODE selects how bus connections are served:
+#   "asyncio" - one event loop holds every bus connection (default)
+#   "thread"  - legacy mode, one daemon thread per connected bus
+# SERVER_BACKLOG is sized so a whole fleet reconnecting at once
+# (e.g. after a cell outage) does not overflow the accept queue.
+SERVER_HOST = "YOUR IP"
+SERVER_PORT = 9999
+SERVER_MODE = "asyncio"
+SERVER_BACKLOG = 1024
+
+# WORKER_PROCESSES > 0 runs that many ingest worker processes, all
+# accepting on SERVER_PORT through SO_REUSEPORT, so parsing and logging
+# scale across CPU cores. Shared state moves into a coordinator process
+# (see Coordinator) and worker logs are forwarded to this process's UI.
+# 0 keeps everything in this one process.
+WORKER_PROCESSES = 0
+
+# METRICS_PORT serves counters and latency histograms in the Prometheus
+# text format at http://METRICS_HOST:METRICS_PORT/metrics. It only listens
+# on localhost by default. With workers, worker N serves its own metrics on
+# METRICS_PORT + N. 0 disables the endpoint.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9100
+
+# A bus that has sent nothing for HEARTBEAT_INTERVAL seconds is sent a
+# PING; one silent for HEARTBEAT_TIMEOUT seconds is disconnected.
+HEARTBEAT_INTERVAL = 15
+HEARTBEAT_TIMEOUT = 45
+
+# Traffic from a bus also counts as a sign of life. Busy buses are never
+# PINGed, so the coordinator's "last seen" (Ping a Bus) is refreshed from
+# any inbound read, at most once per LIVENESS_REPORT_SECONDS per bus to
+# keep it off the coordinator proxy's hot path.
+LIVENESS_REPORT_SECONDS = 5
 
 # --------------- MYSQL CONNECTION --------------- #
 # Establishes and returns a connection to the local MySQL database.
-# Update the credentials and database name as needed.
+# Update the credentials and database name as needed. The tables and
+# indexes are created by Software/Database/migrate.py.
+# Autocommit keeps a pooled connection from holding an old read snapshot
+# between uses; writes still call commit() as before.
 
 def connect():
     return pymysql.connect(
         host="localhost",
         user="root",
         password="YOUR PASSWORD",
-        database="YOUR DATABASE"
+        database="YOUR DATABASE",
+        autocommit=True
     )
 
 
-# --------------- HANDLE CLIENT CONNECTION --------------- #
-# Handles communication with a connected bus client.
-# Processes handshake messages, pings, and RFID+GPS data,
-# logs valid attendance entries, and manages client disconnection.
+# --------------- MYSQL CONNECTION POOL --------------- #
+# MySQLStorage borrows a connection from db_pool instead of opening one
+# per query:
+#   conn = db_pool.acquire()  ...  db_pool.release(conn)
+# The pool bounds how many connections each process holds. Whether it is
+# faster than a connection per query has not been measured against a
+# real MySQL server (benchHotPaths.py --mysql), and tag reads do not go
+# through it (ROSTER CACHE).
+# At most MYSQL_POOL_SIZE connections exist per process; acquire() waits
+# up to MYSQL_POOL_TIMEOUT for one to come back. A connection idle for
+# MYSQL_IDLE_CHECK seconds is pinged (reconnecting if the server dropped
+# it) before it is reused, and one released after an error that closed it
+# is discarded. Each worker process builds its own connections after fork.
+
+MYSQL_POOL_SIZE = 8
+MYSQL_POOL_TIMEOUT = 5
+MYSQL_IDLE_CHECK = 30
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of database connections"""
+
+    def __init__(self, factory, max_size, idle_check, timeout):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_check = idle_check
+        self.timeout = timeout
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.idle = []              # (connection, released_at), most recent last
+        self.slots = threading.BoundedSemaphore(self.max_size)
+        self.pid = os.getpid()
+
+    def acquire(self):
+        if self.pid != os.getpid():
+            # Forked: the parent's sockets are not ours to use.
+            self.reset()
+        if not self.slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"no database connection free after {self.timeout}s")
+        try:
+            while True:
+                with self.lock:
+                    conn, released_at = self.idle.pop() if self.idle else (None, None)
+                if conn is None:
+                    metrics.inc("busserver_db_connects_total")
+                    return self.factory()
+                if time.monotonic() - released_at < self.idle_check:
+                    return conn
+                try:
+                    conn.ping(reconnect=True)
+                    return conn
+                except Exception:
+                    close_quietly(conn)
+        except BaseException:
+            self.slots.release()
+            raise
 
-def handle_client(client_socket, addr):
-    server_logs.put(f"🔌 Connected to {addr}")
+    def release(self, conn):
+        if conn.open:
+            with self.lock:
+                self.idle.append((conn, time.monotonic()))
+        self.slots.release()
+
+    def idle_connections(self):
+        return len(self.idle)
+
+
+def close_quietly(conn):
     try:
-        while True:
-            data = client_socket.recv(1024).decode('utf-8', errors='ignore').strip()
-            if not data:
-                server_logs.put(f"❗ Client {addr} disconnected.")
-                break
+        conn.close()
+    except Exception:
+        pass
+
+
+db_pool = ConnectionPool(lambda: connect(), MYSQL_POOL_SIZE, MYSQL_IDLE_CHECK, MYSQL_POOL_TIMEOUT)
+
+
+# --------------- STORAGE BACKENDS --------------- #
+# Student and attendance rows are read and written only through
+# `storage`, whose backend STORAGE_BACKEND selects:
+#   "mysql"  - the MySQL server from connect(), through db_pool (default)
+#   "sqlite" - an embedded SQLite file at SQLITE_PATH, for depots without
+#              a database server
+# Both run the same SQL (SQLStorage); a backend only says how to run a
+# statement. SQLite runs in WAL mode, so the UI, the roster refresh and
+# the attendance writer read while a batch is written, with
+# synchronous=NORMAL: a power cut can lose the last commits, never corrupt
+# the file. Its statements are fixed strings, which sqlite3 keeps prepared
+# per connection, and each thread (and each worker process after fork)
+# opens its own connection. MySQL's schema comes from migrate.py; the
+# SQLite file creates the same tables and indexes when it is opened.
+
+STORAGE_BACKEND = "mysql"
+SQLITE_PATH = "busserver.db"
+SQLITE_BUSY_TIMEOUT = 5
+
+SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS students (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        rfid_tag TEXT NOT NULL,
+        Bus_ID TEXT NOT NULL,
+        school TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_students_rfid_tag ON students (rfid_tag);
+    CREATE INDEX IF NOT EXISTS idx_students_bus_name ON students (Bus_ID, name);
+    CREATE INDEX IF NOT EXISTS idx_students_name ON students (name);
+    CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY,
+        logged_at TEXT NOT NULL,
+        rfid_tag TEXT NOT NULL,
+        name TEXT NOT NULL,
+        Bus_ID TEXT,
+        status TEXT NOT NULL,
+        gps TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_attendance_logged_at ON attendance (logged_at);
+    CREATE INDEX IF NOT EXISTS idx_attendance_bus ON attendance (Bus_ID, logged_at);
+    CREATE INDEX IF NOT EXISTS idx_attendance_rfid ON attendance (rfid_tag, logged_at);
+"""
+
+INSERT_STUDENT = "INSERT INTO students (name, rfid_tag, Bus_ID, school) VALUES (%s, %s, %s, %s)"
+INSERT_ATTENDANCE = (
+    "INSERT INTO attendance (logged_at, rfid_tag, name, Bus_ID, status, gps) "
+    "VALUES (%s, %s, %s, %s, %s, %s)"
+)
+
+
+class DuplicateTag(Exception):
+    """The RFID tag is already registered to a student"""
+
+
+class SQLStorage:
+    """Student and attendance queries shared by the SQL backends"""
+
+    integrity_errors = ()
+
+    def load_students(self):
+        return self.fetch("SELECT name, rfid_tag, Bus_ID, school FROM students")
+
+    def find_students(self, name):
+        return self.fetch("SELECT id, name, rfid_tag, Bus_ID, school FROM students WHERE name = %s", (name,))
+
+    def add_student(self, name, rfid, bus_id, school):
+        try:
+            self.execute(INSERT_STUDENT, (name, rfid, bus_id, school))
+        except self.integrity_errors as e:
+            if "rfid_tag" in str(e):
+                raise DuplicateTag(rfid) from e
+            raise
+
+    def delete_students(self, name):
+        return self.execute("DELETE FROM students WHERE name = %s", (name,))
+
+    def clear_students(self):
+        return self.execute("DELETE FROM students")
+
+    def student_page(self, columns, bus_id, forward, key, limit):
+        # Keyset page ordered by (name, id); see PAGED STUDENT LISTS.
+        conditions, args = [], []
+        if bus_id is not None:
+            conditions.append("Bus_ID = %s")
+            args.append(bus_id)
+        if key is not None:
+            op = ">" if forward else "<"
+            conditions.append(f"(name {op} %s OR (name = %s AND id {op} %s))")
+            args += [key[0], key[0], key[1]]
+        order = "ASC" if forward else "DESC"
+        sql = f"SELECT name, id{''.join(', ' + column for column in columns)} FROM students"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY name {order}, id {order} LIMIT %s"
+        args.append(limit)
+        return self.fetch(sql, args)
+
+    def insert_attendance(self, rows):
+        # rows: (logged_at, rfid, name, bus_id, status, gps), in one transaction.
+        self.execute_many(INSERT_ATTENDANCE, rows)
+
+    def attendance_since(self, start):
+        # In the order the tags were read. Ordering by the indexed column
+        # (whose entries end with the id) keeps this a range scan of
+        # idx_attendance_logged_at; migrate.py check verifies it.
+        return self.fetch(
+            "SELECT Bus_ID, rfid_tag, status, gps, logged_at FROM attendance "
+            "WHERE logged_at >= %s ORDER BY logged_at, id", (start,)
+        )
+
+
+class MySQLStorage(SQLStorage):
+    """Storage in MySQL, through db_pool"""
+
+    integrity_errors = pymysql.err.IntegrityError
+
+    def fetch(self, sql, args=()):
+        conn = db_pool.acquire()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, args)
+            return list(cursor.fetchall())
+        finally:
+            cursor.close()
+            db_pool.release(conn)
+
+    def execute(self, sql, args=()):
+        conn = db_pool.acquire()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, args)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+            db_pool.release(conn)
+
+    def execute_many(self, sql, rows):
+        conn = db_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            try:
+                conn.begin()
+                cursor.executemany(sql, rows)
+                conn.commit()
+            finally:
+                cursor.close()
+        except Exception:
+            # Drop the connection rather than return one mid-transaction.
+            close_quietly(conn)
+            raise
+        finally:
+            db_pool.release(conn)
+
+
+class SQLiteStorage(SQLStorage):
+    """Storage in an embedded SQLite database file"""
+
+    integrity_errors = sqlite3.IntegrityError
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.statements = {}        # MySQL-style SQL -> the same with ? placeholders
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SQLITE_SCHEMA)
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def statement(self, sql):
+        try:
+            return self.statements[sql]
+        except KeyError:
+            self.statements[sql] = sql.replace("%s", "?")
+            return self.statements[sql]
+
+    def fetch(self, sql, args=()):
+        return self.connection().execute(self.statement(sql), args).fetchall()
+
+    def execute(self, sql, args=()):
+        return self.connection().execute(self.statement(sql), args).rowcount
+
+    def execute_many(self, sql, rows):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(self.statement(sql), rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # Times are stored as ISO text, which sorts and compares like DATETIME.
+    def insert_attendance(self, rows):
+        super().insert_attendance((logged_at.isoformat(" "), *rest) for logged_at, *rest in rows)
+
+    def attendance_since(self, start):
+        return [(bus_id, rfid, status, gps, datetime.fromisoformat(logged_at))
+                for bus_id, rfid, status, gps, logged_at in super().attendance_since(start.isoformat(" "))]
+
+
+def open_storage():
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage(SQLITE_PATH)
+    return MySQLStorage()
+
+
+storage = open_storage()
+
+
+# --------------- STREAM FRAMING --------------- #
+# TCP is a byte stream: one recv() can hold several messages, or only part
+# of one. StreamFramer buffers raw bytes per connection and yields every
+# complete message in the buffer so a burst of boardings is processed as
+# one batch. It starts in text mode (newline-terminated lines) and is
+# switched to binary mode when a bus negotiates PROTO:BIN1 in its
+# HELLO BUS handshake; the switch takes effect on the very next message.
+# A text line that grows past MAX_LINE_BYTES without a newline is
+# discarded and reported, never silently dropped.
+#
+# Binary (BIN1) uplink frames:
+#   [2-byte big-endian length][1-byte type][payload]
+#   type 0x01 EVENT: 12-byte EPC, 1 flag byte (bit 0 = ONBOARD),
+#                    GPS hour, minute, second (1 byte each),
+#                    latitude and longitude as int32 degrees * 1e7
+#   type 0x02 TEXT:  one UTF-8 control line (PONG, LOCATION, ...)
+#   type 0x03 BATCH: uint32 first sequence number, uint8 event count,
+#                    then that many EVENT payloads back to back
+#
+# In text mode a batch is the line "BATCH:<first_seq>:<count>" followed
+# by <count> ordinary RFID lines. Every event in a batch has its own
+# sequence number (first_seq, first_seq + 1, ...); the server answers a
+# processed batch with "ACK:<last_seq>".
 
+#
+# Uplink compression: a bus that sends "COMP:ZLIB" in HELLO BUS (and is
+# answered with COMP:ZLIB in WELCOME) compresses everything it sends after
+# WELCOME as one zlib stream, sync-flushed per write. The stream is
+# primed with COMPRESSION_DICT and keeps its 32 KB history for the life of
+# the connection, so repeated tag prefixes, states and coordinates cost a
+# few bits each. The framer decompresses before splitting messages.
+# COMPRESSION_DICT must be byte-for-byte identical to the client's.
+
+RECV_BUFFER_SIZE = 4096
+MAX_LINE_BYTES = 4096
+COMP_ZLIB = "ZLIB"
+COMPRESSION_DICT = (
+    b"\xe2\x80\x68\x94\x00\x00\x00\x00"
+    b"LOCATION: PONG | UTC | 30.2, -92.0 BATCH:"
+    b"RFID:E2806894000 | STATUS:OFFBOARD | GPS: "
+    b"RFID:E2806894000 | STATUS:ONBOARD | GPS: "
+)
+PROTO_TEXT = "TEXT"
+PROTO_BIN1 = "BIN1"
+FRAME_EVENT = 0x01
+FRAME_TEXT = 0x02
+FRAME_BATCH = 0x03
+FRAME_HEADER = struct.Struct(">HB")
+EVENT_STRUCT = struct.Struct(">12sBBBBii")
+BATCH_HEADER = struct.Struct(">IB")
+COORD_SCALE = 10_000_000
+
+
+class EventBatch:
+    """Attendance events a bus sent together under consecutive sequence numbers"""
+
+    def __init__(self, first_seq, count):
+        self.first_seq = first_seq
+        self.count = count
+        self.events = []
+
+    @property
+    def last_seq(self):
+        return self.first_seq + self.count - 1
+
+    def complete(self):
+        return len(self.events) >= self.count
+
+
+class StreamFramer:
+    """Splits a byte stream into text lines, events and batches"""
+
+    def __init__(self, max_line_bytes=MAX_LINE_BYTES):
+        self.buffer = bytearray()
+        self.max_line_bytes = max_line_bytes
+        self.protocol = PROTO_TEXT
+        self.batch = None
+        self.discarded = 0
+        self.decompressor = None
+        self.compress_from_next = False
+        self.wire_bytes = 0
+        self.raw_bytes = 0
+
+    def feed(self, data):
+        self.wire_bytes += len(data)
+        if self.decompressor is not None:
+            data = self.decompressor.decompress(data)
+        self.raw_bytes += len(data)
+        self.buffer += data
+
+    def start_decompression(self):
+        # Everything after the message currently being processed (the
+        # handshake) is compressed; see messages().
+        self.compress_from_next = True
+
+    def messages(self):
+        # Yields str control lines, (rfid, status, gps_time, coords) event
+        # tuples and EventBatch objects until no complete message is left.
+        pos = 0
+        try:
+            while True:
+                if self.protocol == PROTO_BIN1:
+                    if len(self.buffer) - pos < 2:
+                        break
+                    length = int.from_bytes(self.buffer[pos:pos + 2], "big")
+                    if len(self.buffer) - pos - 2 < length:
+                        break
+                    frame = bytes(self.buffer[pos + 2:pos + 2 + length])
+                    pos += 2 + length
+                    message = decode_frame(frame)
+                else:
+                    end = self.buffer.find(b"\n", pos)
+                    if end == -1:
+                        break
+                    message = self.buffer[pos:end].decode('utf-8', errors='ignore').strip()
+                    pos = end + 1
+                    message = self.collect_text_batch(message)
+                if message:
+                    yield message
+                if self.compress_from_next:
+                    self.compress_from_next = False
+                    self.decompressor = zlib.decompressobj(zdict=COMPRESSION_DICT)
+                    if len(self.buffer) > pos:
+                        tail = self.decompressor.decompress(bytes(self.buffer[pos:]))
+                        self.raw_bytes += len(tail) - (len(self.buffer) - pos)
+                        self.buffer[pos:] = tail
+        finally:
+            del self.buffer[:pos]
+            if self.protocol == PROTO_TEXT and len(self.buffer) > self.max_line_bytes:
+                self.discarded += len(self.buffer)
+                server_logs.put(f"⚠️ Discarded {len(self.buffer)} bytes with no line break", LOG_WARNING)
+                self.buffer.clear()
+
+    def collect_text_batch(self, line):
+        # Gathers the lines that follow a "BATCH:<first_seq>:<count>" header;
+        # returns the EventBatch once complete, None while still collecting.
+        if self.batch is not None:
+            self.batch.events.append(parse_event(line))
+            if not self.batch.complete():
+                return None
+            batch, self.batch = self.batch, None
+            return batch
+        if line.startswith("BATCH:"):
+            try:
+                _, first_seq, count = line.split(":")
+                self.batch = EventBatch(int(first_seq), int(count))
+            except ValueError:
+                server_logs.put(f"⚠️ Malformed batch header: {line}", LOG_WARNING)
+            return None
+        return line
+
+    def flush(self):
+        # Returns a trailing unterminated text line left when the peer closes.
+        rest = []
+        if self.protocol == PROTO_TEXT:
+            line = self.buffer.decode('utf-8', errors='ignore').strip()
+            if line and self.batch is None:
+                rest.append(line)
+        elif self.buffer:
+            server_logs.put(f"⚠️ Discarded {len(self.buffer)} bytes of incomplete frame", LOG_WARNING)
+        if self.batch is not None:
+            server_logs.put(f"⚠️ Discarded unfinished batch starting at #{self.batch.first_seq}", LOG_WARNING)
+            self.batch = None
+        self.buffer.clear()
+        return rest
+
+
+def decode_frame(frame):
+    try:
+        if frame[0] == FRAME_EVENT:
+            return unpack_event(frame, 1)
+        if frame[0] == FRAME_BATCH:
+            first_seq, count = BATCH_HEADER.unpack_from(frame, 1)
+            if len(frame) != 1 + BATCH_HEADER.size + count * EVENT_STRUCT.size:
+                raise struct.error(f"batch of {count} events has wrong length")
+            batch = EventBatch(first_seq, count)
+            offset = 1 + BATCH_HEADER.size
+            for _ in range(count):
+                batch.events.append(unpack_event(frame, offset))
+                offset += EVENT_STRUCT.size
+            return batch
+        if frame[0] == FRAME_TEXT:
+            return frame[1:].decode('utf-8', errors='ignore').strip()
+        server_logs.put(f"⚠️ Unknown frame type {frame[0]:#04x}", LOG_WARNING)
+    except (IndexError, struct.error) as e:
+        server_logs.put(f"⚠️ Malformed frame ({len(frame)} bytes): {e}", LOG_WARNING)
+    return None
+
+
+def unpack_event(buffer, offset):
+    epc, flags, hours, minutes, seconds, lat, lon = EVENT_STRUCT.unpack_from(buffer, offset)
+    return (
+        epc.hex().upper(),
+        "ONBOARD" if flags & 1 else "OFFBOARD",
+        f"{hours:02d}:{minutes:02d}:{seconds:02d} UTC",
+        f"{lat / COORD_SCALE}, {lon / COORD_SCALE}",
+    )
+
+
+# --------------- COORDINATOR --------------- #
+# Fleet-wide state lives in one Coordinator object:
+#   - a BusSession per bus: the event stream the bus is sending (STREAM:<id>
+#     in HELLO BUS), the agreed protocol and compression, and the last
+#     sequence number the server acknowledged
+#   - which connection (worker process + connection number) holds each bus
+#   - the RFID debounce table
+#   - who is on which bus right now (OnboardState)
+# In single-process mode it is a plain local object. With WORKER_PROCESSES
+# set, it runs in its own process behind a multiprocessing manager and
+# every worker talks to it through a proxy, so a bus that reconnects to a
+# different worker still resumes its session and a tag is debounced once
+# fleet-wide. Calls are kept to one per handshake, per read and per ACK.
+#
+# Sessions outlive connections: every WELCOME carries a session TOKEN,
+# and a bus that reconnects sends "RESUME:<token>" instead of HELLO BUS to
+# be re-attached to the same registration, protocol and ACK position in
+# one step. Events it resends that already landed are skipped instead of
+# logged twice. Sessions of buses that stay away longer than SESSION_TTL
+# seconds are forgotten.
+
+SESSION_TTL = 6 * 60 * 60
+
+
+class BusSession:
+    """Registration and acknowledgement state for one bus's event stream"""
+
+    def __init__(self, bus_id, stream_id, protocol, compression, request_ids):
+        self.bus_id = bus_id
+        self.stream_id = stream_id
+        self.protocol = protocol
+        self.compression = compression
+        self.request_ids = request_ids
+        self.token = secrets.token_hex(8)
+        self.acked_seq = 0
+        self.owner = None
+        self.detached_at = None
+
+
+# OnboardState follows every logged ONBOARD/OFFBOARD event, so "who is on
+# bus X", "which bus is student Y on" and "who boarded bus X today" are
+# dictionary lookups instead of a scan of the day's log. It starts over
+# each day, checked on every query as well as every event so a quiet
+# morning does not report yesterday's riders; at startup it is rebuilt
+# from today's rows in the attendance table (load_onboard_state).
+
+class OnboardState:
+    """Who is on each bus now, and who has boarded it today"""
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, day):
+        self.day = day              # (year, month, day) of the events held
+        self.riders = {}            # bus_id -> {rfid: boarded_at}
+        self.last_event = {}        # rfid -> (bus_id, status, at, gps)
+        self.boarded = {}           # bus_id -> set of rfids that boarded today
+
+    def roll_over(self, at):
+        # Starts a new day if `at` falls after the day held. Returns False
+        # for a time on an earlier day.
+        day = time.localtime(at)[:3]
+        if self.day is None or day > self.day:
+            self.reset(day)
+        return day == self.day
+
+    def record(self, bus_id, rfid, status, gps, at):
+        if not self.roll_over(at):
+            return      # a late resend from a previous day
+        previous = self.last_event.get(rfid)
+        if previous is not None and previous[0] != bus_id:
+            # Missed the OFFBOARD from the last bus.
+            self.riders.get(previous[0], {}).pop(rfid, None)
+        status = status.upper()
+        if status == "ONBOARD":
+            self.riders.setdefault(bus_id, {})[rfid] = at
+            self.boarded.setdefault(bus_id, set()).add(rfid)
+        else:
+            self.riders.get(bus_id, {}).pop(rfid, None)
+        self.last_event[rfid] = (bus_id, status, at, gps)
+
+
+class Coordinator:
+    """Sessions, bus ownership, debounce and onboard state shared by all server workers"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}          # bus_id -> BusSession
+        self.tokens = {}            # token -> BusSession
+        self.rfid_timestamps = {}
+        self.liveness = {}          # bus_id -> (last_seen, last_rtt)
+        self.onboard = OnboardState()
+
+    def open_session(self, bus_id, stream_id, protocol, compression, request_ids, owner):
+        # Returns (token, acked_seq). A bus continuing the same stream keeps
+        # its session; a new stream (client restarted) starts a fresh one.
+        with self.lock:
+            self.expire_sessions(time.time())
+            session = self.sessions.get(bus_id)
+            if session is None or session.stream_id != stream_id:
+                if session is not None:
+                    self.tokens.pop(session.token, None)
+                session = BusSession(bus_id, stream_id, protocol, compression, request_ids)
+                self.sessions[bus_id] = session
+                self.tokens[session.token] = session
+            session.protocol = protocol
+            session.compression = compression
+            session.request_ids = request_ids
+            session.owner = owner
+            session.detached_at = None
+            self.liveness[bus_id] = (time.time(), self.liveness.get(bus_id, (0, None))[1])
+            return session.token, session.acked_seq
+
+    def resume_session(self, token, owner):
+        # Returns (bus_id, protocol, compression, request_ids, acked_seq), or
+        # None if the token is unknown or expired.
+        with self.lock:
+            self.expire_sessions(time.time())
+            session = self.tokens.get(token)
+            if session is None:
+                return None
+            session.owner = owner
+            session.detached_at = None
+            self.liveness[session.bus_id] = (time.time(), self.liveness.get(session.bus_id, (0, None))[1])
+            return session.bus_id, session.protocol, session.compression, session.request_ids, session.acked_seq
+
+    def ack(self, token, seq):
+        with self.lock:
+            session = self.tokens.get(token)
+            if session is not None:
+                session.acked_seq = max(session.acked_seq, seq)
+
+    def detach(self, token, owner):
+        # Starts the SESSION_TTL clock, unless the bus already reconnected
+        # and a newer connection owns the session.
+        with self.lock:
+            session = self.tokens.get(token)
+            if session is not None and session.owner == owner:
+                session.owner = None
+                session.detached_at = time.time()
+
+    def bus_owner(self, bus_id):
+        with self.lock:
+            session = self.sessions.get(bus_id)
+            return session.owner if session is not None else None
+
+    def heartbeat(self, bus_id, seen_at, rtt):
+        with self.lock:
+            self.liveness[bus_id] = (seen_at, rtt)
+
+    def seen(self, bus_id, seen_at):
+        # Traffic other than a PONG: newer last_seen, same RTT.
+        with self.lock:
+            last_seen, rtt = self.liveness.get(bus_id, (0, None))
+            self.liveness[bus_id] = (max(last_seen, seen_at), rtt)
+
+    def bus_liveness(self, bus_id):
+        # Returns (last_seen, last_rtt) from the last heartbeat, traffic or
+        # registration, or None for an unknown bus.
+        with self.lock:
+            return self.liveness.get(bus_id)
+
+    def connected_buses(self):
+        with self.lock:
+            return sorted(bus_id for bus_id, session in self.sessions.items() if session.owner is not None)
+
+    def debounce(self, rfids, now):
+        # Returns one flag per tag: True if the read is outside the
+        # DEBOUNCE_SECONDS window (and starts a new window), False if dropped.
+        accepted = []
+        with self.lock:
+            for rfid in rfids:
+                if (now - self.rfid_timestamps.get(rfid, 0)) < DEBOUNCE_SECONDS:
+                    accepted.append(False)
+                else:
+                    self.rfid_timestamps[rfid] = now
+                    accepted.append(True)
+        return accepted
+
+    def forget_reads(self, rfids):
+        # Reopens the debounce window for reads that were never logged, so
+        # their resend is not dropped as a repeat.
+        with self.lock:
+            for rfid in rfids:
+                self.rfid_timestamps.pop(rfid, None)
+
+    def record_boardings(self, events):
+        # events is a list of (bus_id, rfid, status, gps, at), in order.
+        with self.lock:
+            for event in events:
+                self.onboard.record(*event)
+
+    def riders(self, bus_id):
+        # Returns [(rfid, boarded_at)] for the students on the bus now.
+        with self.lock:
+            self.onboard.roll_over(time.time())
+            return list(self.onboard.riders.get(bus_id, {}).items())
+
+    def rider_counts(self):
+        with self.lock:
+            self.onboard.roll_over(time.time())
+            return {bus_id: len(riders) for bus_id, riders in self.onboard.riders.items() if riders}
+
+    def student_location(self, rfid):
+        # Returns (bus_id, status, at, gps) of the student's last event
+        # today, or None.
+        with self.lock:
+            self.onboard.roll_over(time.time())
+            return self.onboard.last_event.get(rfid)
+
+    def boarded_today(self, bus_id):
+        with self.lock:
+            self.onboard.roll_over(time.time())
+            return set(self.onboard.boarded.get(bus_id, ()))
+
+    def expire_sessions(self, now):
+        # Drops sessions whose bus has been gone longer than SESSION_TTL.
+        # Called with self.lock held.
+        for token, session in list(self.tokens.items()):
+            if session.detached_at is not None and now - session.detached_at > SESSION_TTL:
+                del self.tokens[token]
+                if self.sessions.get(session.bus_id) is session:
+                    del self.sessions[session.bus_id]
+                    self.liveness.pop(session.bus_id, None)
+
+
+coordinator = Coordinator()
+
+
+# --------------- METRICS --------------- #
+# Counters and latency histograms for this process, scraped over HTTP in
+# the Prometheus text exposition format (see METRICS_PORT). Per-bus event
+# counters give events/sec per bus with rate(). Queue depth and connected
+# buses are read when scraped. Each worker process keeps and serves its
+# own set.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+METRIC_HELP = {
+    "busserver_bus_events_total": ("counter", "Attendance events received, per bus"),
+    "busserver_debounce_drops_total": ("counter", "Tag reads dropped inside the debounce window"),
+    "busserver_events_logged_total": ("counter", "Attendance entries written to the daily log"),
+    "busserver_bus_registrations_total": ("counter", "HELLO BUS registrations"),
+    "busserver_reconnects_total": ("counter", "Session resume attempts by reconnecting buses"),
+    "busserver_student_lookup_seconds": ("histogram", "get_student_name latency"),
+    "busserver_log_attendance_seconds": ("histogram", "Attendance log write latency, per batch"),
+    "busserver_heartbeat_rtt_seconds": ("histogram", "PING to PONG round trip of heartbeats"),
+    "busserver_heartbeat_reaps_total": ("counter", "Connections dropped for missing heartbeats"),
+    "busserver_db_connects_total": ("counter", "MySQL connections opened by the pool"),
+    "busserver_db_idle_connections": ("gauge", "Idle MySQL connections in the pool"),
+    "busserver_roster_students": ("gauge", "Students in this process's roster cache"),
+    "busserver_attendance_rows_total": ("counter", "Attendance rows committed to the database"),
+    "busserver_attendance_flush_seconds": ("histogram", "Attendance batch INSERT and commit latency"),
+    "busserver_attendance_flush_errors_total": ("counter", "Attendance batches that failed and were requeued"),
+    "busserver_attendance_dropped_total": ("counter", "Attendance rows dropped from the full pending queue"),
+    "busserver_attendance_pending": ("gauge", "Attendance rows waiting to be written to the database"),
+    "busserver_stage_items_total": ("counter", "Items (one bus read each) processed by a pipeline stage"),
+    "busserver_stage_busy_seconds_total": ("counter", "Time a pipeline stage spent processing"),
+    "busserver_stage_waits_total": ("counter", "Puts that waited on a pipeline stage's full queue"),
+    "busserver_stage_queue_depth": ("gauge", "Items queued in front of a pipeline stage"),
+    "busserver_log_lines": ("gauge", "Lines held in the log buffer (or waiting to be forwarded, in a worker)"),
+    "busserver_log_dropped_total": ("counter", "Log lines dropped from the full log buffer"),
+    "busserver_connected_buses": ("gauge", "Buses connected to this process"),
+    "busserver_open_connections": ("gauge", "Open bus connections in this process, registered or not"),
+}
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+
+class Metrics:
+    """Thread-safe counters and histograms rendered as Prometheus text"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}      # (name, labels) -> value
+        self.histograms = {}    # name -> Histogram
+
+    def inc(self, name, amount=1, labels=()):
+        # labels is a tuple of (key, value) pairs.
+        with self.lock:
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def value(self, name, labels=()):
+        return self.counters.get((name, labels), 0)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def render(self):
+        try:
+            log_lines = server_logs.qsize()
+        except NotImplementedError:     # a worker's multiprocessing queue on macOS
+            log_lines = -1
+        log_dropped = server_logs.dropped() if isinstance(server_logs, LogBuffer) else 0
+        lines = []
+        with self.lock:
+            by_name = {}
+            for (name, labels), value in self.counters.items():
+                by_name.setdefault(name, []).append((labels, value))
+            for name in sorted(by_name):
+                describe_metric(lines, name)
+                for labels, value in sorted(by_name[name]):
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+            for name in sorted(self.histograms):
+                histogram = self.histograms[name]
+                describe_metric(lines, name)
+                bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+                cumulative = 0
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum {histogram.total}")
+                lines.append(f"{name}_count {cumulative}")
+        for name, value in (("busserver_log_lines", log_lines),
+                            ("busserver_log_dropped_total", log_dropped),
+                            ("busserver_connected_buses", len(connection_registry)),
+                            ("busserver_open_connections", connection_registry.open_connections()),
+                            ("busserver_db_idle_connections", db_pool.idle_connections()),
+                            ("busserver_roster_students", len(roster)),
+                            ("busserver_attendance_pending", len(attendance_writer.pending))):
+            describe_metric(lines, name)
+            lines.append(f"{name} {value}")
+        describe_metric(lines, "busserver_stage_queue_depth")
+        for stage in event_pipeline.stages:
+            lines.append(f"busserver_stage_queue_depth{format_labels(stage.labels)} {stage.depth()}")
+        return "\n".join(lines) + "\n"
+
+
+def describe_metric(lines, name):
+    kind, text = METRIC_HELP.get(name, ("untyped", name))
+    lines.append(f"# HELP {name} {text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+metrics = Metrics()
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass    # stderr would draw over the curses UI
+
+
+def start_metrics_server(port):
+    if not port:
+        return
+    try:
+        httpd = http.server.ThreadingHTTPServer((METRICS_HOST, port), MetricsHandler)
+    except OSError as e:
+        server_logs.put(f"⚠️ Metrics endpoint unavailable on port {port}: {e}", LOG_WARNING)
+        return
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    server_logs.put(f"📈 Metrics on http://{METRICS_HOST}:{port}/metrics (worker {WORKER_ID})")
+
+
+# --------------- CLIENT CONNECTIONS --------------- #
+# ClientConnection is the per-socket state both server modes share:
+# address, connect time, negotiated protocol and compression, counters and
+# heartbeat state. `conn` is a socket or an AsyncBusConnection. `owner`
+# identifies the connection to the Coordinator across worker processes.
+# The ConnectionRegistry indexes this process's connections both ways:
+# by bus ID, and by connection (client.owner, with client.bus_id pointing
+# back), so every lookup is O(1) whatever the fleet size.
+
+WORKER_ID = 0
+connection_ids = itertools.count(1)
+
+
+class ClientConnection:
+    """State for one connected bus client"""
+
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        self.owner = (WORKER_ID, next(connection_ids))
+        self.connected_at = time.time()
+        self.framer = StreamFramer()
+        self.bus_id = None
+        self.token = None
+        self.compression = None
+        self.request_ids = False
+        self.acked_seq = 0
+        self.events = 0
+        self.last_seen = time.time()
+        self.reported_seen = 0      # last_seen last passed to the coordinator
+        self.last_rtt = None
+        self.heartbeat = None
+        self.closed = False
+        self.log_failed = False     # a log write failed; ACK nothing more
+
+    def sendall(self, data):
+        self.conn.sendall(data)
+
+    def send_line(self, line):
+        self.conn.sendall((line + "\n").encode('utf-8'))
+
+    def send_command(self, command, request_id=None):
+        # "PING:<id>" for buses that echo request ids, bare "PING" otherwise.
+        self.send_line(f"{command}:{request_id}" if request_id and self.request_ids else command)
+
+    def describe(self):
+        # e.g. "('10.0.0.7', 51234), up 312s, BIN1+ZLIB, 148 event(s)"
+        wire = self.framer.protocol + (f"+{self.compression}" if self.compression else "")
+        return f"{self.addr}, up {time.time() - self.connected_at:.0f}s, {wire}, {self.events} event(s)"
+
+
+class ConnectionRegistry:
+    """This process's bus connections, indexed by bus ID and by connection"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_bus = {}            # bus_id -> ClientConnection
+        self.by_connection = {}     # client.owner -> ClientConnection
+
+    def add(self, client):
+        with self.lock:
+            self.by_connection[client.owner] = client
+
+    def bind(self, client, bus_id):
+        # Points bus_id at this connection. A bus that reconnects before its
+        # old connection is noticed as closed simply takes over the entry.
+        with self.lock:
+            if client.bus_id is not None and client.bus_id != bus_id and self.by_bus.get(client.bus_id) is client:
+                del self.by_bus[client.bus_id]
+            client.bus_id = bus_id
+            self.by_bus[bus_id] = client
+
+    def remove(self, client):
+        # Forgets a closed connection. Returns its bus ID if the bus was
+        # still registered to it, else None.
+        with self.lock:
+            self.by_connection.pop(client.owner, None)
+            if client.bus_id is not None and self.by_bus.get(client.bus_id) is client:
+                del self.by_bus[client.bus_id]
+                return client.bus_id
+        return None
+
+    def get(self, bus_id):
+        return self.by_bus.get(bus_id)
+
+    def open_connections(self):
+        return len(self.by_connection)
+
+    def __contains__(self, bus_id):
+        return bus_id in self.by_bus
+
+    def __len__(self):
+        return len(self.by_bus)
+
+
+connection_registry = ConnectionRegistry()
+
+
+def report_seen(client):
+    client.reported_seen = client.last_seen
+    try:
+        coordinator.seen(client.bus_id, client.last_seen)
+    except Exception as e:
+        server_logs.put(f"⚠️ Could not update liveness for {client.bus_id}: {e}", LOG_WARNING)
+
+
+# --------------- HANDLE CLIENT MESSAGES --------------- #
+# Processes a batch of messages received from a bus client in one read:
+# handshake, replies to server requests, and RFID+GPS data (text lines, decoded
+# BIN1 event tuples, or sequenced EventBatches). Shared by the threaded
+# and asyncio servers. Handshakes and replies are handled right here;
+# the read's attendance events, with the highest batch sequence number to
+# ACK, go to the event pipeline (see EVENT PIPELINE), which ACKs them only
+# after they are written to the daily log.
+
+def process_batch(messages, client):
+    client.last_seen = time.time()
+    if client.bus_id and client.last_seen - client.reported_seen >= LIVENESS_REPORT_SECONDS:
+        report_seen(client)
+    events = []
+    sequenced = []
+    received = 0
+    last = None
+    ack_seq = None
+    for data in messages:
+        if isinstance(data, EventBatch):
+            received += data.count
+            last = data
+            ack_seq = data.last_seq
+            batch_events = unacked_events(client, data)
+            events.extend(batch_events)
+            sequenced.extend([True] * len(batch_events))
+            continue
+
+        if isinstance(data, tuple):
+            event = data
+        else:
             if data.startswith("HELLO BUS:"):
-                bus_id = data.split("HELLO BUS:")[1].strip()
-                client_bus_map[bus_id] = client_socket
-                server_logs.put(f"🚌 Registered {bus_id} from {addr}")
+                register_bus(data, client)
+                continue
+
+            if data.startswith("RESUME:"):
+                resume_session(data, client)
                 continue
 
-            if data.startswith("PONG"):
-                # Find the bus ID for this socket
-                bus_id = next((bid for bid, sock in client_bus_map.items() if sock == client_socket), "Unknown")
-                formatted = f"📡 Ping response from {bus_id}: {data}"
-                server_logs.put(formatted)
-                LOG_HISTORY.append(formatted)
-                if len(LOG_HISTORY) > MAX_LOG_LINES:
-                    LOG_HISTORY.pop(0)
+            if data.startswith(REPLY_PREFIXES):
+                handle_reply(data, client)
                 continue
 
-            server_logs.put(f"📥 Received: {data}")
+            event = parse_event(data)
+
+        received += 1
+        last = data
+        if event:
+            events.append(event)
+            sequenced.append(False)
+
+    client.events += received
+    if received:
+        metrics.inc("busserver_bus_events_total", received, (("bus", client.bus_id or "unknown"),))
+    if received == 1 and not isinstance(last, EventBatch):
+        server_logs.put(f"📥 Received: {format_event(last) if isinstance(last, tuple) else last}")
+    elif received:
+        server_logs.put(f"📥 Received {received} event(s) from {client.bus_id or client.addr} in one read")
+
+    if events or ack_seq is not None:
+        event_pipeline.submit(PipelineItem(client, events, ack_seq, sequenced))
+
+
+# Returns the events of a batch that this bus's session has not
+# acknowledged yet (a resent batch may overlap what already landed).
+
+def unacked_events(client, batch):
+    skip = max(0, client.acked_seq - batch.first_seq + 1)
+    if skip:
+        server_logs.put(f"🔁 Skipped {min(skip, batch.count)} already acknowledged event(s) from {client.bus_id}")
+    return [event for event in batch.events[skip:] if event]
+
+
+# Handles "HELLO BUS:<id>[ | PROTO:<name>][ | STREAM:<id>][ | COMP:ZLIB][ | REQID:1]".
+# Registers the bus, agrees on the wire protocol (BIN1 if the bus asks for
+# it, TEXT otherwise), uplink compression and request ids, and opens its
+# session with the Coordinator. Older clients send no options and ignore
+# the reply.
+
+def register_bus(data, client):
+    fields = data.split("HELLO BUS:")[1].split(" | ")
+    bus_id = fields[0].strip()
+    options = dict(f.strip().split(":", 1) for f in fields[1:] if ":" in f)
+    protocol = PROTO_BIN1 if options.get("PROTO", "").strip() == PROTO_BIN1 else PROTO_TEXT
+    stream_id = options.get("STREAM", "").strip()
+    compression = COMP_ZLIB if options.get("COMP", "").strip() == COMP_ZLIB else None
+    request_ids = options.get("REQID", "").strip() == "1"
+
+    token, acked_seq = coordinator.open_session(
+        bus_id, stream_id, protocol, compression, request_ids, client.owner
+    )
+    attach_session(client, bus_id, token, protocol, compression, request_ids, acked_seq)
+    metrics.inc("busserver_bus_registrations_total")
+    server_logs.put(f"🚌 Registered {bus_id} from {client.addr} ({protocol}, acked #{acked_seq})")
+
+
+# Handles "RESUME:<token>" from a reconnecting bus. On success the bus is
+# back on its old registration without renegotiating; otherwise it is
+# told "RESUME FAILED" and falls back to HELLO BUS.
+
+def resume_session(data, client):
+    token = data.split("RESUME:", 1)[1].strip()
+    session = coordinator.resume_session(token, client.owner)
+    metrics.inc("busserver_reconnects_total", labels=(("result", "resumed" if session else "failed"),))
+    if session is None:
+        client.send_line("RESUME FAILED")
+        server_logs.put(f"⚠️ Unknown session token from {client.addr}", LOG_WARNING)
+        return
+    bus_id, protocol, compression, request_ids, acked_seq = session
+    attach_session(client, bus_id, token, protocol, compression, request_ids, acked_seq)
+    server_logs.put(f"🔁 Resumed {bus_id} from {client.addr} ({protocol}, acked #{acked_seq})")
+
+
+# Binds a session to a connection and answers with
+# "WELCOME | PROTO:<name> | ACK:<last_seq> | TOKEN:<token>[ | COMP:ZLIB]"
+# so the client knows which encoding to use, which queued events already
+# landed and how to resume next time. A resumed session starts a fresh
+# compression stream on the new connection.
+
+def attach_session(client, bus_id, token, protocol, compression, request_ids, acked_seq):
+    client.token = token
+    client.compression = compression
+    client.request_ids = request_ids
+    client.acked_seq = acked_seq
+    connection_registry.bind(client, bus_id)
+    welcome = f"WELCOME | PROTO:{protocol} | ACK:{acked_seq} | TOKEN:{token}"
+    if compression:
+        welcome += f" | COMP:{compression}"
+        client.framer.start_decompression()
+    client.send_line(welcome)
+    client.framer.protocol = protocol
+
+
+def format_event(event):
+    rfid, status, gps_time, coords = event
+    return f"RFID:{rfid} | STATUS:{status} | GPS: {gps_time} | {coords}"
+
+
+# A bus stamps each read with the GPS time of day ("HH:MM:SS UTC"), not a
+# date. read_time() puts it on the latest UTC day that does not place it
+# after the read arrived (READ_TIME_SKEW allows for a GPS clock a little
+# ahead of ours), so a read replayed from the bus's spool keeps the time
+# it was made, provided the bus was offline for less than a day. A stamp
+# that does not parse falls back to the arrival time.
+
+READ_TIME_SKEW = 300
+
+
+def read_time(gps, received_at):
+    try:
+        seconds = int(gps[0:2]) * 3600 + int(gps[3:5]) * 60 + int(gps[6:8])
+    except ValueError:
+        return received_at
+    at = received_at - received_at % 86400 + seconds
+    if at > received_at + READ_TIME_SKEW:
+        at -= 86400
+    return min(at, received_at)
+
+
+# Splits "RFID:<tag> | STATUS:<state> | GPS: <time> | <lat>, <lon>"
+# into (rfid, status, gps_time, coords). Returns None for other text.
+
+def parse_event(data):
+    parts = data.split(" | ")
+    if len(parts) != 4:
+        return None
+    rfid = parts[0].replace("RFID:", "").strip()
+    status = parts[1].replace("STATUS:", "").strip()
+    gps_time = parts[2].replace("GPS:", "").strip()
+    coords = parts[3].strip()
+    return rfid, status, gps_time, coords
+
+
+# Applies the debounce window to a list of events with one Coordinator
+# call. Returns a keep/drop flag per event.
+
+def debounce_events(events):
+    accepted = coordinator.debounce([event[0] for event in events], time.time())
+    dropped = accepted.count(False)
+    if dropped:
+        metrics.inc("busserver_debounce_drops_total", dropped)
+    return accepted
+
+
+# Looks up each event's student. Returns the (rfid, name, status, gps)
+# attendance entries for tags on the roster.
+
+def lookup_students(events):
+    entries = []
+    for rfid, status, gps_time, coords in events:
+        try:
+            start = time.perf_counter()
+            name = get_student_name(rfid)
+            metrics.observe("busserver_student_lookup_seconds", time.perf_counter() - start)
+            if name:
+                entries.append((rfid, name, status, f"{gps_time} | {coords}"))
+        except Exception as e:
+            server_logs.put(f"⚠️ Error processing: {e}", LOG_WARNING)
+    return entries
+
 
-            parts = data.split(" | ")
-            if len(parts) == 4:
+# Records that a bus's events up to ack_seq are logged and tells the bus.
+# ACKs are cumulative, so after a failed log write on a connection nothing
+# more is acknowledged on it (see drop_unlogged).
+
+def acknowledge(client, ack_seq):
+    if client.log_failed:
+        return
+    client.acked_seq = max(client.acked_seq, ack_seq)
+    if client.token:
+        coordinator.ack(client.token, client.acked_seq)
+    if not client.closed:
+        client.send_line(f"ACK:{ack_seq}")
+
+
+# Reports uplink volume for a finished connection: bytes per event as sent
+# on the wire and after decompression.
+
+def log_wire_usage(client):
+    framer = client.framer
+    if not client.events:
+        return
+    mode = "zlib" if framer.decompressor is not None else "uncompressed"
+    server_logs.put(
+        f"📦 {client.bus_id or client.addr}: {client.events} event(s), "
+        f"{framer.wire_bytes / client.events:.1f} B/event on the wire, "
+        f"{framer.raw_bytes / client.events:.1f} B/event raw ({mode})"
+    )
+
+
+# Removes every bus registered on a connection once it closes and starts
+# the SESSION_TTL clock on its session so the bus can still resume it.
+
+def unregister_connection(client):
+    client.closed = True
+    log_wire_usage(client)
+    if client.token:
+        coordinator.detach(client.token, client.owner)
+    if client.heartbeat is not None:
+        pending_requests.discard(client.heartbeat)
+    bus_id = connection_registry.remove(client)
+    if bus_id is not None:
+        server_logs.put(f"❎ Removed {bus_id} from active list")
+
+
+# --------------- EVENT PIPELINE --------------- #
+# Socket readers only parse. Each read's attendance events travel as one
+# PipelineItem through a chain of stages, each running in its own threads:
+#   debounce - drops repeat reads inside DEBOUNCE_SECONDS (unnumbered
+#              events only, see debounce_stage)
+#   enrich   - looks up each tag's student in the roster cache
+#   persist  - appends to the daily log and queues the attendance rows
+#   notify   - shows the entries in the UI, updates who is onboard and
+#              ACKs the batch
+# A stage has PIPELINE_WORKERS[stage] threads, each draining its own
+# bounded queue of PIPELINE_QUEUE_SIZE items. Items are routed by
+# connection, so one bus's events stay in order through every stage and
+# its ACKs go out in sequence. A thread takes everything waiting in its
+# queue (up to PIPELINE_BATCH_ITEMS) at once: debounce makes one
+# Coordinator call and persist one file append for all of it. When a
+# queue is full the stage feeding it waits, back to the socket reader, so
+# a slow stage pushes back on the buses over TCP instead of growing
+# memory. A batch is only ACKed after every stage up to its log write
+# succeeded; if one fails, its connections are closed so the buses resend.
+# Items processed, busy time, waits on full queues and queue depth are
+# exported per stage, and shown under the menu. On exit, each ingest
+# process waits up to SHUTDOWN_DRAIN_SECONDS for the items in flight to
+# leave the last stage, then writes the attendance rows still waiting
+# (stop_ingest).
+
+PIPELINE_QUEUE_SIZE = 1024
+PIPELINE_BATCH_ITEMS = 64
+PIPELINE_WORKERS = {"debounce": 1, "enrich": 1, "persist": 1, "notify": 1}
+SHUTDOWN_DRAIN_SECONDS = 10
+
+
+class PipelineItem:
+    """The attendance events from one read of one bus connection"""
+
+    def __init__(self, client, events, ack_seq, sequenced):
+        self.client = client
+        self.events = events        # (rfid, status, gps_time, coords)
+        self.sequenced = sequenced  # per event: True if it came in a numbered batch
+        self.received_at = time.time()
+        self.entries = []           # (rfid, name, status, gps) once enriched
+        self.read_times = []        # per entry: when the bus read the tag (read_time)
+        self.ack_seq = ack_seq
+        self.logged = False
+
+
+class Stage:
+    """A pipeline stage: worker threads, each with its own bounded queue"""
+
+    def __init__(self, name, handler, workers, queue_size, batch_items):
+        self.name = name
+        self.handler = handler      # handler(items), run on a list of items
+        self.queues = [queue.Queue(queue_size) for _ in range(workers)]
+        self.batch_items = batch_items
+        self.labels = (("stage", name),)
+        self.next = None
+
+    def start(self):
+        for items in self.queues:
+            threading.Thread(target=self.run, args=(items,), daemon=True).start()
+
+    def put(self, item):
+        items = self.queues[hash(item.client.owner) % len(self.queues)]
+        try:
+            items.put_nowait(item)
+        except queue.Full:
+            metrics.inc("busserver_stage_waits_total", 1, self.labels)
+            items.put(item)
+
+    def run(self, items):
+        while True:
+            batch = [items.get()]
+            while len(batch) < self.batch_items:
                 try:
-                    rfid = parts[0].replace("RFID:", "").strip()
-                    status = parts[1].replace("STATUS:", "").strip()
-                    gps_time = parts[2].replace("GPS:", "").strip()
-                    coords = parts[3].strip()
-
-                    now = time.time()
-                    if (now - rfid_timestamps.get(rfid, 0)) < DEBOUNCE_SECONDS:
-                        continue
-                    rfid_timestamps[rfid] = now
-
-                    name = get_student_name(rfid)
-                    if name:
-                        log_attendance(name, status, f"{gps_time} | {coords}")
-                        server_logs.put(f"📝 Logged: {name} - {status}")
-                except Exception as e:
-                    server_logs.put(f"⚠️ Error processing: {e}")
+                    batch.append(items.get_nowait())
+                except queue.Empty:
+                    break
+            if self.process(batch) and self.next is not None:
+                for item in batch:
+                    self.next.put(item)
+            for _ in batch:
+                items.task_done()
+
+    def process(self, batch):
+        # Returns False if the handler failed. The batch's events were not
+        # logged, so they go the way of a failed log write (drop_unlogged):
+        # nothing more is ACKed on their connections and the buses resend.
+        start = time.perf_counter()
+        try:
+            self.handler(batch)
+        except Exception as e:
+            server_logs.put(f"❌ Pipeline {self.name} stage error, {len(batch)} item(s) dropped: {e}", LOG_ERROR)
+            drop_unlogged(batch)
+            return False
+        finally:
+            metrics.inc("busserver_stage_items_total", len(batch), self.labels)
+            metrics.inc("busserver_stage_busy_seconds_total", time.perf_counter() - start, self.labels)
+        return True
+
+    def depth(self):
+        return sum(items.qsize() for items in self.queues)
+
+    def busy(self):
+        # Items queued or being processed.
+        return sum(items.unfinished_tasks for items in self.queues)
+
+
+class EventPipeline:
+    """The chain of stages attendance events pass through"""
+
+    def __init__(self, stages):
+        self.stages = stages
+        for stage, following in zip(stages, stages[1:]):
+            stage.next = following
+        self.started = False
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        self.started = True
+
+    def submit(self, item):
+        # Until start() (e.g. in the benchmark) items run through every
+        # stage in the calling thread.
+        if self.started:
+            self.stages[0].put(item)
+            return
+        for stage in self.stages:
+            if not stage.process([item]):
+                return
+
+    def drain(self, timeout):
+        # Waits until no item is queued or being processed in any stage.
+        # Returns False if some still were after `timeout` seconds.
+        deadline = time.monotonic() + timeout
+        while any(stage.busy() for stage in self.stages):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+
+# Events from numbered batches skip the debounce window. The bus already
+# waits out its own cooldown before queuing a read, and a batch replayed
+# after a reconnect delivers reads made minutes apart back to back, so an
+# ONBOARD and the OFFBOARD after it would otherwise fall in one window and
+# the OFFBOARD be dropped, then ACKed and deleted from the bus's spool.
+# Their resends are dropped by sequence number instead (unacked_events).
+
+def debounce_stage(items):
+    events = [event for item in items for event, sequenced in zip(item.events, item.sequenced) if not sequenced]
+    if not events:
+        return
+    accepted = iter(debounce_events(events))
+    for item in items:
+        kept = [(event, sequenced) for event, sequenced in zip(item.events, item.sequenced)
+                if sequenced or next(accepted)]
+        item.events = [event for event, _ in kept]
+        item.sequenced = [sequenced for _, sequenced in kept]
+
+
+def enrich_stage(items):
+    for item in items:
+        if item.events:
+            item.entries = lookup_students(item.events)
+            item.read_times = [read_time(entry[3], item.received_at) for entry in item.entries]
+
+
+def persist_stage(items):
+    entries = [entry for item in items for entry in item.entries]
+    try:
+        if entries:
+            start = time.perf_counter()
+            log_attendance_batch(entries)
+            metrics.observe("busserver_log_attendance_seconds", time.perf_counter() - start)
+            metrics.inc("busserver_events_logged_total", len(entries))
+    except Exception as e:
+        server_logs.put(f"⚠️ Error logging {len(entries)} entries: {e}", LOG_WARNING)
+        drop_unlogged(items)
+        return
+    for item in items:
+        item.logged = True
+        if item.entries:
+            attendance_writer.submit(item.client.bus_id, item.entries, item.read_times)
+
+
+# A later ACK would also cover the events whose write failed (or that a
+# stage failed on), so each of their connections is closed instead: the
+# bus reconnects, resumes its session and resends everything after its
+# last ACK, and the failed reads are let through the debounce window again.
+
+def drop_unlogged(items):
+    try:
+        coordinator.forget_reads([event[0] for item in items for event in item.events])
+    except Exception as e:
+        server_logs.put(f"⚠️ Could not reopen debounce for unlogged reads: {e}", LOG_WARNING)
+    for client in {id(item.client): item.client for item in items}.values():
+        if client.log_failed:
+            continue
+        client.log_failed = True
+        client.closed = True
+        server_logs.put(f"⚠️ Closing {client.bus_id or client.addr} so it resends from ACK {client.acked_seq}", LOG_WARNING)
+        try:
+            client.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def notify_stage(items):
+    boardings = []
+    for item in items:
+        if not item.logged:
+            continue
+        for (rfid, name, status, gps), at in zip(item.entries, item.read_times):
+            server_logs.put(f"📝 Logged: {name} - {status}")
+            if item.client.bus_id is not None:
+                boardings.append((item.client.bus_id, rfid, status, gps, at))
+    if boardings:
+        try:
+            coordinator.record_boardings(boardings)
+        except Exception as e:
+            server_logs.put(f"⚠️ Could not update onboard state: {e}", LOG_WARNING)
+    for item in items:
+        if item.logged and item.ack_seq is not None:
+            try:
+                acknowledge(item.client, item.ack_seq)
+            except Exception as e:
+                server_logs.put(f"⚠️ Could not ACK {item.client.bus_id or item.client.addr}: {e}", LOG_WARNING)
+
+
+event_pipeline = EventPipeline([
+    Stage(name, handler, PIPELINE_WORKERS[name], PIPELINE_QUEUE_SIZE, PIPELINE_BATCH_ITEMS)
+    for name, handler in (("debounce", debounce_stage), ("enrich", enrich_stage),
+                          ("persist", persist_stage), ("notify", notify_stage))
+])
+
+
+# --------------- BUS REQUESTS --------------- #
+# Server-to-bus requests carry a request id, "PING:<id>" and
+# "GET_LOCATION:<id>", which the bus echoes in its reply, "PONG:<id> | ..."
+# and "LOCATION:<id> | ...". Each request is a Future that process_batch
+# resolves with (reply, round trip seconds) when the reply arrives, so
+# callers wait on the future (or on many at once) with a deadline.
+# Ids are "<worker>-<n>"; a worker sends replies to requests made by the
+# UI process back over the reply queue. Buses that did not offer REQID:1
+# in HELLO get the bare command, and a reply without an id resolves the
+# oldest pending request of that kind for the bus.
+
+REPLY_COMMANDS = {"PONG": "PING", "LOCATION": "GET_LOCATION"}
+REPLY_PREFIXES = tuple(REPLY_COMMANDS)
+reply_queue = None
+
+
+class PendingRequests:
+    """Futures for requests sent to buses, keyed by request id"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}      # request_id -> (bus_id, command, future), oldest first
+        self.ids = itertools.count(1)
+
+    def create(self, bus_id, command):
+        future = concurrent.futures.Future()
+        future.request_id = f"{WORKER_ID}-{next(self.ids)}"
+        future.sent_at = time.time()
+        with self.lock:
+            self.requests[future.request_id] = (bus_id, command, future)
+        return future
+
+    def resolve(self, request_id, reply):
+        with self.lock:
+            request = self.requests.pop(request_id, None)
+        return request is not None and complete_request(request[2], reply)
+
+    def resolve_oldest(self, bus_id, command, reply):
+        with self.lock:
+            for request_id, (pending_bus, pending_command, _) in self.requests.items():
+                if pending_bus == bus_id and pending_command == command:
+                    request = self.requests.pop(request_id)
+                    break
+            else:
+                return False
+        return complete_request(request[2], reply)
+
+    def discard(self, future):
+        # Forgets a request that timed out; its callbacks see it cancelled.
+        with self.lock:
+            self.requests.pop(future.request_id, None)
+        future.cancel()
+
+
+def complete_request(future, reply):
+    if not future.set_running_or_notify_cancel():
+        return False
+    future.set_result((reply, time.time() - future.sent_at))
+    return True
+
+
+pending_requests = PendingRequests()
+
+
+# Sends a PING or GET_LOCATION to a bus, wherever it is connected, and
+# returns the Future for its reply.
+
+def request_bus(bus_id, command):
+    future = pending_requests.create(bus_id, command)
+    try:
+        send_to_bus(bus_id, command, future.request_id)
+    except Exception as e:
+        pending_requests.discard(future)
+        future = concurrent.futures.Future()
+        future.set_exception(e)
+    return future
+
+
+# Resolves the request a "PONG..." or "LOCATION..." line answers, here or,
+# for a request made by another process, by forwarding it there.
+
+def handle_reply(data, client):
+    head = data.split(" | ", 1)[0]
+    kind, _, request_id = head.partition(":")
+    command = REPLY_COMMANDS.get(kind.strip())
+    if command is None:
+        return
+    request_id = request_id.strip() if client.request_ids else ""
+    if request_id:
+        if request_id.split("-", 1)[0] == str(WORKER_ID):
+            pending_requests.resolve(request_id, data)
+        elif reply_queue is not None:
+            reply_queue.put((request_id, client.bus_id, command, data))
+    elif not pending_requests.resolve_oldest(client.bus_id, command, data) and reply_queue is not None:
+        reply_queue.put((None, client.bus_id, command, data))
+
+
+def resolve_forwarded_reply(request_id, bus_id, command, data):
+    if request_id:
+        pending_requests.resolve(request_id, data)
+    else:
+        pending_requests.resolve_oldest(bus_id, command, data)
+
+
+# --------------- HEARTBEATS --------------- #
+# Every connection is checked on a hashed timing wheel instead of being
+# polled: scheduling is O(1) and each one-second tick only touches the
+# connections due in that slot. Traffic from a bus just updates its
+# last_seen; when its check comes up, a quiet bus gets a PING request and
+# a silent one is disconnected. The PONG gives the round trip time, which
+# is recorded with the Coordinator so any process can read a bus's last
+# RTT and last-seen time in O(1).
+
+HEARTBEAT_TICK = 1.0
+
+
+class TimerWheel:
+    """Hashed timing wheel with one slot per tick"""
+
+    def __init__(self, tick, slots):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = 0
+        self.lock = threading.Lock()
+
+    def schedule(self, item, delay):
+        # Delays longer than the wheel come back early and are rescheduled.
+        ticks = max(1, min(len(self.slots) - 1, math.ceil(delay / self.tick)))
+        with self.lock:
+            self.slots[(self.current + ticks) % len(self.slots)].append(item)
+
+    def advance(self):
+        # Moves to the next slot and returns the items due in it.
+        with self.lock:
+            self.current = (self.current + 1) % len(self.slots)
+            due, self.slots[self.current] = self.slots[self.current], []
+        return due
+
+
+heartbeat_wheel = TimerWheel(HEARTBEAT_TICK, 64)
+
+
+def track_heartbeat(client):
+    heartbeat_wheel.schedule(client, HEARTBEAT_INTERVAL)
+
+
+def run_heartbeats():
+    next_tick = time.monotonic()
+    while True:
+        next_tick += HEARTBEAT_TICK
+        time.sleep(max(0, next_tick - time.monotonic()))
+        now = time.time()
+        for client in heartbeat_wheel.advance():
+            check_heartbeat(client, now)
+
+
+def check_heartbeat(client, now):
+    if client.closed:
+        return
+    idle = now - client.last_seen
+    if idle >= HEARTBEAT_TIMEOUT:
+        reap_connection(client, idle)
+        return
+    if idle >= HEARTBEAT_INTERVAL and client.bus_id:
+        if client.heartbeat is None or now - client.heartbeat.sent_at >= HEARTBEAT_INTERVAL:
+            if client.heartbeat is not None:
+                pending_requests.discard(client.heartbeat)
+            client.heartbeat = pending_requests.create(client.bus_id, "PING")
+            client.heartbeat.add_done_callback(lambda future: record_heartbeat(client, future))
+            try:
+                client.send_command("PING", client.heartbeat.request_id)
+            except Exception:
+                reap_connection(client, idle)
+                return
+        delay = min(HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT - idle)
+    else:
+        delay = HEARTBEAT_INTERVAL - idle
+    heartbeat_wheel.schedule(client, delay)
+
+
+# Closes a silent connection; its handler sees EOF and cleans up as for
+# any disconnect, so the bus can still resume its session.
+
+def reap_connection(client, idle):
+    client.closed = True
+    if client.heartbeat is not None:
+        pending_requests.discard(client.heartbeat)
+    metrics.inc("busserver_heartbeat_reaps_total")
+    server_logs.put(f"💀 Dropping {client.bus_id or client.addr}: no heartbeat for {idle:.0f}s", LOG_ERROR)
+    try:
+        client.conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def record_heartbeat(client, future):
+    if future.cancelled():
+        return
+    _, rtt = future.result()
+    client.last_rtt = rtt
+    if client.heartbeat is future:
+        client.heartbeat = None
+    metrics.observe("busserver_heartbeat_rtt_seconds", rtt)
+    coordinator.heartbeat(client.bus_id, time.time(), rtt)
+
+
+# --------------- HANDLE CLIENT CONNECTION --------------- #
+# Handles communication with a connected bus client.
+# Frames the byte stream into messages, processes every complete message
+# from one recv() as a batch, and manages client disconnection.
+
+def handle_client(client_socket, addr):
+    server_logs.put(f"🔌 Connected to {addr}")
+    client = ClientConnection(client_socket, addr)
+    connection_registry.add(client)
+    track_heartbeat(client)
+    try:
+        while True:
+            data = client_socket.recv(RECV_BUFFER_SIZE)
+            if not data:
+                process_batch(client.framer.flush(), client)
+                server_logs.put(f"❗ Client {addr} disconnected.", LOG_WARNING)
+                break
+            client.framer.feed(data)
+            process_batch(client.framer.messages(), client)
 
     except Exception as e:
-        server_logs.put(f"⚠️ Client error: {e}")
+        server_logs.put(f"⚠️ Client error: {e}", LOG_WARNING)
     finally:
-        for bus_id, sock in list(client_bus_map.items()):
-            if sock == client_socket:
-                del client_bus_map[bus_id]
-                server_logs.put(f"❎ Removed {bus_id} from active list")
+        unregister_connection(client)
         client_socket.close()
-        server_logs.put(f"🔴 Disconnected: {addr}")
+        server_logs.put(f"🔴 Disconnected: {addr}", LOG_ERROR)
 
 
 # --------------- SERVER THREAD STARTUP --------------- #
@@ -150,43 +1915,706 @@ def handle_client(client_socket, addr):
 def start_server_thread():
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind(("YOUR IP", 9999))
-    server_socket.listen(5)
-    server_logs.put("🟢 Server listening on YOUR IP:9999")
+    if WORKER_PROCESSES:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server_socket.bind((SERVER_HOST, SERVER_PORT))
+    server_socket.listen(SERVER_BACKLOG)
+    server_logs.put(f"🟢 Server listening on {SERVER_HOST}:{SERVER_PORT} (worker {WORKER_ID})", LOG_OK)
 
     while True:
         client_socket, addr = server_socket.accept()
         threading.Thread(target=handle_client, args=(client_socket, addr), daemon=True).start()
 
 
-# --------------- Database Functions --------------- #
-# Retrieves the student name associated with a given RFID tag
-# from the MySQL database. Returns None if not found.
+# --------------- ASYNCIO SERVER --------------- #
+# Event-loop server mode. A single thread running an asyncio loop holds
+# every bus connection, so a fleet-wide reconnect costs one coroutine per
+# bus instead of one OS thread per bus. Blocking work (MySQL lookups and
+# log file writes) is handed to the loop's default thread pool, which
+# keeps the loop responsive while preserving per-bus message order.
 
-def get_student_name(rfid):
-    conn = connect()
-    cursor = conn.cursor()
+class AsyncBusConnection:
+    """Socket-like wrapper so UI threads can send to an asyncio client"""
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+
+    def sendall(self, data):
+        if self.writer.is_closing():
+            raise ConnectionError("connection closed")
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.writer.close)
+
+    def shutdown(self, how):
+        self.close()
+
+
+async def handle_client_async(reader, writer):
+    loop = asyncio.get_running_loop()
+    addr = writer.get_extra_info("peername")
+    conn = AsyncBusConnection(loop, writer)
+    server_logs.put(f"🔌 Connected to {addr}")
+    client = ClientConnection(conn, addr)
+    connection_registry.add(client)
+    track_heartbeat(client)
     try:
-        cursor.execute("SELECT name FROM students WHERE rfid_tag = %s", (rfid,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        while True:
+            data = await reader.read(RECV_BUFFER_SIZE)
+            if not data:
+                await loop.run_in_executor(None, process_batch, client.framer.flush(), client)
+                server_logs.put(f"❗ Client {addr} disconnected.", LOG_WARNING)
+                break
+            client.framer.feed(data)
+            await loop.run_in_executor(None, process_batch, client.framer.messages(), client)
+
+    except Exception as e:
+        server_logs.put(f"⚠️ Client error: {e}", LOG_WARNING)
     finally:
-        cursor.close()
-        conn.close()
+        unregister_connection(client)
+        writer.close()
+        server_logs.put(f"🔴 Disconnected: {addr}", LOG_ERROR)
+
+
+# Raises this process's open-file limit to the hard limit so the
+# event loop can hold thousands of bus sockets at once.
+
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            return soft
+        return hard
+    return soft
+
+
+async def run_async_server():
+    server = await asyncio.start_server(
+        handle_client_async, SERVER_HOST, SERVER_PORT,
+        backlog=SERVER_BACKLOG, reuse_address=True, reuse_port=bool(WORKER_PROCESSES)
+    )
+    server_logs.put(f"🟢 Server listening on {SERVER_HOST}:{SERVER_PORT} (asyncio, worker {WORKER_ID})", LOG_OK)
+    async with server:
+        await server.serve_forever()
+
+
+def start_async_server_thread():
+    limit = raise_file_limit()
+    server_logs.put(f"📂 Open file limit: {limit}")
+    asyncio.run(run_async_server())
+
+
+# --------------- MULTI-PROCESS WORKERS --------------- #
+# With WORKER_PROCESSES set, main() forks:
+#   - a coordinator process holding the Coordinator (sessions, bus
+#     ownership, debounce table), served by a multiprocessing manager
+#   - WORKER_PROCESSES ingest workers, each running the normal threaded or
+#     asyncio server on the same port with SO_REUSEPORT; the kernel spreads
+#     incoming bus connections across them
+# Workers put their log lines on a shared queue that this process copies
+# into server_logs for the UI. Admin commands for a bus (send_to_bus) go
+# to the worker that holds its socket through that worker's command queue,
+# and replies to this process's requests come back on a shared reply queue.
+# Roster changes made in the admin menu go to every worker the same way.
+
+COORDINATOR_AUTHKEY = secrets.token_bytes(16)
+worker_command_queues = {}
+worker_processes = {}
+
+
+class CoordinatorManager(BaseManager):
+    pass
+
+
+CoordinatorManager.register("get_coordinator", callable=lambda: coordinator)
+
+
+def start_workers():
+    global coordinator
+    ctx = multiprocessing.get_context("fork")
+    manager = CoordinatorManager(authkey=COORDINATOR_AUTHKEY, ctx=ctx)
+    manager.start()
+
+    log_queue = ctx.Queue()
+    replies = ctx.Queue()
+    for worker_id in range(1, WORKER_PROCESSES + 1):
+        commands = ctx.Queue()
+        worker_command_queues[worker_id] = commands
+        worker_processes[worker_id] = ctx.Process(
+            target=run_worker, args=(worker_id, manager.address, log_queue, commands, replies), daemon=True
+        )
+        worker_processes[worker_id].start()
+
+    coordinator = manager.get_coordinator()
+    threading.Thread(target=forward_worker_logs, args=(log_queue,), daemon=True).start()
+    threading.Thread(target=forward_worker_replies, args=(replies,), daemon=True).start()
+    server_logs.put(f"🧩 Started {WORKER_PROCESSES} ingest worker(s) on port {SERVER_PORT}")
+    return manager
+
+
+# Asks every worker to drain its pipeline and attendance writer and exit
+# (see stop_ingest), waits for them, then stops the coordinator they share.
+
+def stop_workers(manager):
+    for commands in worker_command_queues.values():
+        commands.put(("stop",))
+    for process in worker_processes.values():
+        process.join(SHUTDOWN_DRAIN_SECONDS + 5)
+        if process.is_alive():
+            process.terminate()
+    manager.shutdown()
+
+
+# Entry point of a worker process: swaps the local coordinator and log
+# queue for the shared ones, then serves bus connections until main()
+# sends "stop".
+
+def run_worker(worker_id, address, log_queue, commands, replies):
+    global WORKER_ID, coordinator, server_logs, reply_queue
+    WORKER_ID = worker_id
+    server_logs = WorkerLog(log_queue)
+    reply_queue = replies
+    manager = CoordinatorManager(address=address, authkey=COORDINATOR_AUTHKEY)
+    manager.connect()
+    coordinator = manager.get_coordinator()
+
+    threading.Thread(target=run_heartbeats, daemon=True).start()
+    threading.Thread(target=run_roster_refresh, daemon=True).start()
+    start_attendance_writer()
+    event_pipeline.start()
+    start_metrics_server(METRICS_PORT + worker_id if METRICS_PORT else 0)
+    target = start_async_server_thread if SERVER_MODE == "asyncio" else start_server_thread
+    threading.Thread(target=target, daemon=True).start()
+    run_worker_commands(commands)
+
+
+def run_worker_commands(commands):
+    while True:
+        message = commands.get()
+        if message[0] == "stop":
+            stop_ingest()
+            return
+        if message[0] == "roster":
+            roster.apply(message[1])
+            continue
+        _, bus_id, command, request_id = message
+        client = connection_registry.get(bus_id)
+        if client is None:
+            server_logs.put(f"⚠️ {bus_id} is no longer on worker {WORKER_ID}", LOG_WARNING)
+            continue
+        try:
+            client.send_command(command, request_id)
+        except Exception as e:
+            server_logs.put(f"❌ Error sending to {bus_id}: {e}", LOG_ERROR)
+
+
+class WorkerLog:
+    """A worker's server_logs: puts (message, level) on the shared log queue"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def put(self, message, level=LOG_INFO):
+        self.queue.put((message, level))
+
+    def qsize(self):
+        return self.queue.qsize()
+
+
+def forward_worker_logs(log_queue):
+    while True:
+        server_logs.put(*log_queue.get())
+
+
+def forward_worker_replies(replies):
+    while True:
+        resolve_forwarded_reply(*replies.get())
+
+
+# Sends a command (e.g. "PING", with an optional request id) to a
+# connected bus, wherever its socket lives. Raises KeyError if the bus is
+# not connected.
+
+def send_to_bus(bus_id, command, request_id=None):
+    client = connection_registry.get(bus_id)
+    if client is not None:
+        client.send_command(command, request_id)
+        return
+    owner = coordinator.bus_owner(bus_id)
+    if owner is None or owner[0] not in worker_command_queues:
+        raise KeyError(bus_id)
+    worker_command_queues[owner[0]].put(("send", bus_id, command, request_id))
+
+
+def bus_is_connected(bus_id):
+    return bus_id in connection_registry or coordinator.bus_owner(bus_id) is not None
+
+
+# --------------- NAME SEARCH --------------- #
+# Student names are searched in memory while they are typed. NameIndex
+# keeps every word-start suffix of each name, casefolded ("ana maria
+# lopez", "maria lopez", "lopez"), in one sorted list, so text typed from
+# the start of any word is found with bisect in O(log n) plus the matches.
+# The sorted list does the job of a trie without a dict per character. A
+# trigram index catches typos: when nothing starts with the typed text,
+# names that share enough three-letter pieces with it (at least
+# NAME_MATCH_SIMILARITY of its trigrams) are scored against the whole name
+# and against each of its words, keeping the best, so "thompsn" finds
+# "Ava Thompson". Trigrams alone rate a swapped pair of letters in a short
+# word ("smiht") too low, so the score is difflib's match ratio, and names
+# scoring at least NAME_MATCH_RATIO are offered instead. Trigram overlap
+# does the ranking; difflib only reranks the NAME_RERANK best of it.
+#
+# Prefix lookups take microseconds. Typo lookups do not make the
+# sub-millisecond target: on a 20000-name roster they measure 1-4 ms,
+# nearly all of it counting the names behind each trigram. That is
+# accepted on purpose. They only run when no name starts with the typed
+# text, and a few milliseconds is still well inside a keystroke.
+
+NAME_MATCH_SIMILARITY = 0.4
+NAME_MATCH_RATIO = 0.75
+NAME_SUGGESTIONS = 8
+NAME_RERANK = 16
+
+
+def name_keys(name):
+    words = name.casefold().split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def trigrams(text):
+    padded = f"  {' '.join(text.casefold().split())} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def name_parts(name):
+    # Each word of the name and, for a name of several words, the whole name.
+    words = name.casefold().split()
+    return words + [" ".join(words)] if len(words) > 1 else words
+
+
+def name_trigrams(name):
+    # Trigrams of the whole name and of each word on its own.
+    return set().union(*map(trigrams, name_parts(name)))
+
+
+class NameIndex:
+    """Prefix and trigram index over student names"""
+
+    def __init__(self, names=()):
+        self.counts = collections.Counter(names)    # name -> students with that name
+        self.keys = sorted((key, name) for name in self.counts for key in name_keys(name))
+        self.name_grams = {name: name_trigrams(name) for name in self.counts}
+        self.grams = {}                             # trigram -> set of names
+        for name, grams in self.name_grams.items():
+            for gram in grams:
+                self.grams.setdefault(gram, set()).add(name)
+
+    def add(self, name):
+        self.counts[name] += 1
+        if self.counts[name] > 1:
+            return
+        for key in name_keys(name):
+            bisect.insort(self.keys, (key, name))
+        self.name_grams[name] = name_trigrams(name)
+        for gram in self.name_grams[name]:
+            self.grams.setdefault(gram, set()).add(name)
+
+    def remove(self, name):
+        if self.counts[name] > 1:
+            self.counts[name] -= 1
+            return
+        if not self.counts.pop(name, 0):
+            return
+        for key in name_keys(name):
+            i = bisect.bisect_left(self.keys, (key, name))
+            if i < len(self.keys) and self.keys[i] == (key, name):
+                del self.keys[i]
+        for gram in self.name_grams.pop(name):
+            names = self.grams[gram]
+            names.discard(name)
+            if not names:
+                del self.grams[gram]
+
+    def search(self, text, limit):
+        text = " ".join(text.casefold().split())
+        if not text:
+            return []
+        found = []
+        i = bisect.bisect_left(self.keys, (text,))
+        while i < len(self.keys) and len(found) < limit and self.keys[i][0].startswith(text):
+            if self.keys[i][1] not in found:
+                found.append(self.keys[i][1])
+            i += 1
+        if not found and len(text) >= 3:
+            found = self.similar(text, limit)
+        return found
+
+    def similar(self, text, limit):
+        # Trigrams found in more than a quarter of all names are not counted:
+        # a name has at most len(common) of them, so it needs the rest of
+        # `needed` from the rarer ones before it is worth scoring exactly.
+        # Of those, only the NAME_RERANK sharing the most trigrams are scored.
+        query = trigrams(text)
+        needed = math.ceil(NAME_MATCH_SIMILARITY * len(query))
+        common = {gram for gram in query if len(self.grams.get(gram, ())) > len(self.counts) // 4}
+        if len(common) >= needed:
+            common = set()
+        shared = collections.Counter(itertools.chain.from_iterable(self.grams.get(gram, ()) for gram in query - common))
+        if common:
+            shared = collections.Counter({name: count + len(common & self.name_grams[name])
+                                          for name, count in shared.items() if count + len(common) >= needed})
+        candidates = [(count, name) for name, count in shared.most_common(NAME_RERANK)]
+        matcher = difflib.SequenceMatcher(None, autojunk=False)
+        matcher.set_seq2(text)
+        ratios = {}                 # part -> ratio; many names share a word
+        scored = []
+        for count, name in candidates:
+            if count < needed:
+                break
+            score = 0
+            for part in name_parts(name):
+                if part in ratios:
+                    score = max(score, ratios[part])
+                    continue
+                matcher.set_seq1(part)
+                if matcher.real_quick_ratio() > score and matcher.quick_ratio() > score:
+                    ratios[part] = matcher.ratio()
+                    score = max(score, ratios[part])
+            if score >= NAME_MATCH_RATIO:
+                scored.append((score, name))
+        return [name for score, name in sorted(scored, reverse=True)[:limit]]
+
+
+# --------------- ROSTER CACHE --------------- #
+# The students table only changes through the admin menu, so each process
+# keeps it in memory, indexed by RFID tag, by Bus_ID and by name (see
+# NAME SEARCH), and tag reads never query MySQL. It is loaded at startup
+# (workers inherit it when forked), updated write-through by
+# add/delete/clear, with each change also sent to every worker, and
+# reloaded every ROSTER_REFRESH_SECONDS to pick up edits made outside this
+# program.
+
+ROSTER_REFRESH_SECONDS = 300
+
+
+class RosterCache:
+    """In-memory copy of the students table, by RFID tag and by Bus_ID"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_tag = {}            # rfid_tag -> (name, bus_id, school)
+        self.by_bus = {}            # bus_id -> set of rfid_tags
+        self.names = NameIndex()
+        self.generation = 0         # bumped by every write-through change
+
+    def load(self, rows, generation=None):
+        # Replaces the index with (name, rfid_tag, Bus_ID, school) rows,
+        # unless a change landed after the rows were read.
+        by_tag, by_bus = {}, {}
+        for name, rfid, bus_id, school in rows:
+            by_tag[rfid] = (name, bus_id, school)
+            by_bus.setdefault(bus_id, set()).add(rfid)
+        names = NameIndex(student[0] for student in by_tag.values())
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self.by_tag, self.by_bus, self.names = by_tag, by_bus, names
+        return True
+
+    def refresh(self):
+        generation = self.generation
+        return self.load(storage.load_students(), generation)
+
+    def apply(self, change):
+        # change is ("add", (name, rfid, bus_id, school)), ("remove", name)
+        # or ("clear",), mirroring a committed admin write.
+        with self.lock:
+            self.generation += 1
+            if change[0] == "add":
+                name, rfid, bus_id, school = change[1]
+                self.discard_tag(rfid)
+                self.by_tag[rfid] = (name, bus_id, school)
+                self.by_bus.setdefault(bus_id, set()).add(rfid)
+                self.names.add(name)
+            elif change[0] == "remove":
+                for rfid in [tag for tag, student in self.by_tag.items() if student[0] == change[1]]:
+                    self.discard_tag(rfid)
+            elif change[0] == "clear":
+                self.by_tag, self.by_bus, self.names = {}, {}, NameIndex()
+
+    def discard_tag(self, rfid):
+        # Called with self.lock held.
+        student = self.by_tag.pop(rfid, None)
+        if student is not None:
+            self.names.remove(student[0])
+            tags = self.by_bus.get(student[1])
+            if tags is not None:
+                tags.discard(rfid)
+                if not tags:
+                    del self.by_bus[student[1]]
+
+    def name(self, rfid):
+        student = self.by_tag.get(rfid)
+        return student[0] if student else None
+
+    def bus_tags(self, bus_id):
+        with self.lock:
+            return set(self.by_bus.get(bus_id, ()))
+
+    def search_names(self, text, limit=NAME_SUGGESTIONS):
+        with self.lock:
+            return self.names.search(text, limit)
+
+    def __len__(self):
+        return len(self.by_tag)
+
+
+roster = RosterCache()
+
+
+# Applies an admin change to this process's roster and every worker's.
+
+def update_roster(change):
+    roster.apply(change)
+    for commands in worker_command_queues.values():
+        commands.put(("roster", change))
+
+
+def load_roster():
+    try:
+        roster.refresh()
+        server_logs.put(f"📚 Roster loaded: {len(roster)} student(s)")
+    except Exception as e:
+        server_logs.put(f"⚠️ Roster load failed, retrying in {ROSTER_REFRESH_SECONDS}s: {e}", LOG_WARNING)
+
+
+def run_roster_refresh():
+    while True:
+        time.sleep(ROSTER_REFRESH_SECONDS)
+        try:
+            before = len(roster)
+            if roster.refresh() and len(roster) != before:
+                server_logs.put(f"🔄 Roster refreshed: {len(roster)} student(s)")
+        except Exception as e:
+            server_logs.put(f"⚠️ Roster refresh failed: {e}", LOG_WARNING)
+
+
+# --------------- Database Functions --------------- #
+# Retrieves the student name associated with a given RFID tag from the
+# roster cache. Returns None if not found.
+
+def get_student_name(rfid):
+    return roster.name(rfid)
 
 # ---------------- Log Attendance Section ----------- # 
 # Logs a student's attendance entry with timestamp, name, status, and GPS data
 # into a daily text file inside the "logs" directory.
 
-def log_attendance(name, status, gps):
-    today = datetime.now().strftime("%Y-%m-%d")
+def log_attendance(name, status, gps, rfid=None):
+    log_attendance_batch([(rfid, name, status, gps)])
+
+# Writes several (rfid, name, status, gps) entries with one open/append,
+# so a burst of boardings costs a single file write.
+
+def log_attendance_batch(entries):
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    stamp = now.strftime('%H:%M:%S')
     if not os.path.exists("logs"):
         os.makedirs("logs")
     with open(f"logs/{today}_attendance.txt", "a") as f:
-        f.write(f"{datetime.now().strftime('%H:%M:%S')} | {name} | {status} | {gps}\n")
+        f.write("".join(f"{stamp} | {name} | {status} | {gps}\n" for _, name, status, gps in entries))
+
+# --------------- ATTENDANCE WRITER --------------- #
+# Accepted scans are also stored in the attendance table (migration 0003)
+# so boardings can be queried. The pipeline's persist stage only appends
+# rows to attendance_writer, which never blocks on the database; a
+# background thread writes them through `storage` with one multi-row
+# INSERT and one commit per batch, as soon as ATTENDANCE_BATCH_SIZE rows
+# are waiting or ATTENDANCE_FLUSH_SECONDS after the last write. While the
+# database is unreachable rows are kept and retried, up to
+# ATTENDANCE_PENDING_LIMIT, beyond which the oldest are dropped (and
+# counted); the daily text log still has every entry. Each ingest process
+# (every worker, with WORKER_PROCESSES) runs its own writer.
+
+ATTENDANCE_BATCH_SIZE = 500
+ATTENDANCE_FLUSH_SECONDS = 1.0
+ATTENDANCE_PENDING_LIMIT = 100000
+
+
+class AttendanceWriter:
+    """Background writer that group-commits attendance rows to storage"""
+
+    def __init__(self, batch_size, flush_seconds, pending_limit):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.pending_limit = pending_limit
+        self.pending = collections.deque()   # (logged_at, rfid, name, bus_id, status, gps)
+        self.condition = threading.Condition()
+        self.failing = False
+
+    def submit(self, bus_id, entries, read_times):
+        # logged_at is when the bus read the tag, one time per entry.
+        logged_at = {at: datetime.fromtimestamp(at).replace(microsecond=0) for at in set(read_times)}
+        rows = [(logged_at[at], rfid, name, bus_id, status, gps)
+                for (rfid, name, status, gps), at in zip(entries, read_times)]
+        with self.condition:
+            self.pending.extend(rows)
+            self.trim()
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def trim(self):
+        # Called with self.condition held.
+        excess = len(self.pending) - self.pending_limit
+        if excess > 0:
+            for _ in range(excess):
+                self.pending.popleft()
+            metrics.inc("busserver_attendance_dropped_total", excess)
+
+    def take_batch(self):
+        with self.condition:
+            count = min(self.batch_size, len(self.pending))
+            return [self.pending.popleft() for _ in range(count)]
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending) >= self.batch_size, timeout=self.flush_seconds)
+            batch = self.take_batch()
+            if batch and not self.flush(batch):
+                time.sleep(self.flush_seconds)
+
+    def flush(self, batch):
+        # Writes one batch in one transaction. On failure the batch goes
+        # back to the front of the queue, in order, to be retried.
+        try:
+            start = time.perf_counter()
+            self.write(batch)
+            metrics.observe("busserver_attendance_flush_seconds", time.perf_counter() - start)
+            metrics.inc("busserver_attendance_rows_total", len(batch))
+        except Exception as e:
+            metrics.inc("busserver_attendance_flush_errors_total")
+            with self.condition:
+                self.pending.extendleft(reversed(batch))
+                self.trim()
+            if not self.failing:
+                self.failing = True
+                server_logs.put(f"⚠️ Attendance writes to the database failing, {len(self.pending)} row(s) held: {e}", LOG_WARNING)
+            return False
+        if self.failing:
+            self.failing = False
+            server_logs.put("✅ Attendance writes to the database resumed", LOG_OK)
+        return True
+
+    def write(self, batch):
+        storage.insert_attendance(batch)
+
+    def drain(self):
+        # Writes whatever is still pending, e.g. when the server exits.
+        while True:
+            batch = self.take_batch()
+            if not batch or not self.flush(batch):
+                return
+
+
+attendance_writer = AttendanceWriter(ATTENDANCE_BATCH_SIZE, ATTENDANCE_FLUSH_SECONDS, ATTENDANCE_PENDING_LIMIT)
+
+
+def start_attendance_writer():
+    threading.Thread(target=attendance_writer.run, daemon=True).start()
+
+
+# Called when an ingest process exits: lets the events already read
+# through the pipeline, then writes every attendance row still pending.
+
+def stop_ingest():
+    if not event_pipeline.drain(SHUTDOWN_DRAIN_SECONDS):
+        server_logs.put(f"⚠️ Pipeline still busy after {SHUTDOWN_DRAIN_SECONDS}s, exiting anyway", LOG_WARNING)
+    attendance_writer.drain()
+
+
+# Rebuilds today's onboard state from the attendance table at startup, so
+# a restarted server still knows who is on each bus. Events that had not
+# reached the table when the server stopped are missing.
+
+def load_onboard_state():
+    try:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        events = [(bus_id, rfid, status, gps, logged_at.timestamp())
+                  for bus_id, rfid, status, gps, logged_at in storage.attendance_since(today) if bus_id is not None]
+        coordinator.record_boardings(events)
+        server_logs.put(f"🚌 Onboard state restored from {len(events)} attendance row(s)")
+    except Exception as e:
+        server_logs.put(f"⚠️ Could not restore onboard state: {e}", LOG_WARNING)
+
+# --------------- NAME TYPE-AHEAD --------------- #
+# Reads a student name at (y, x), listing up to NAME_SUGGESTIONS roster
+# names that match what has been typed so far on the lines below it.
+# Up/Down highlight a suggestion, Tab copies it into the field, and Enter
+# accepts the highlighted suggestion, or the typed text when none is
+# highlighted. Esc cancels and returns None.
+
+def prompt_student_name(stdscr, y, x):
+    curses.noecho()
+    try:
+        curses.curs_set(1)
+    except curses.error:
+        pass
+    height, width = stdscr.getmaxyx()
+    rows = max(0, min(NAME_SUGGESTIONS, height - y - 2))
+    text = ""
+    selected = -1
+    try:
+        while True:
+            suggestions = roster.search_names(text, rows) if text and rows else []
+            selected = min(selected, len(suggestions) - 1)
+            for row in range(rows):
+                stdscr.move(y + 1 + row, 0)
+                stdscr.clrtoeol()
+                if row < len(suggestions):
+                    style = curses.A_REVERSE if row == selected else curses.A_NORMAL
+                    stdscr.addstr(y + 1 + row, 4, safe_truncate(suggestions[row], width - 6), style)
+            stdscr.move(y, x)
+            stdscr.clrtoeol()
+            stdscr.addstr(y, x, text[-max(1, width - x - 1):])
+            stdscr.refresh()
+
+            key = stdscr.get_wch()
+            if key in ("\n", "\r", curses.KEY_ENTER):
+                return suggestions[selected] if selected >= 0 else text.strip()
+            if key == "\x1b":
+                return None
+            if key in (curses.KEY_BACKSPACE, "\x7f", "\b"):
+                text = text[:-1]
+                selected = -1
+            elif key == curses.KEY_DOWN:
+                selected = min(selected + 1, len(suggestions) - 1)
+            elif key == curses.KEY_UP:
+                selected = max(selected - 1, -1)
+            elif key == "\t" and suggestions:
+                text = suggestions[max(selected, 0)]
+                selected = -1
+            elif isinstance(key, str) and key.isprintable():
+                text += key
+                selected = -1
+    finally:
+        for row in range(rows):
+            stdscr.move(y + 1 + row, 0)
+            stdscr.clrtoeol()
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+
 
 # --------------- Add a Student Section ------------ # 
-# Adds a new student to the MySQL database via a text-based UI.
+# Adds a new student to the database via a text-based UI.
 # Prompts for name, RFID, bus ID, and school, then stores the data with error handling.
 
 def add_student(stdscr):
@@ -215,15 +2643,9 @@ def add_student(stdscr):
 
             curses.noecho()
 
-            conn = None
             try:
-                conn = connect()
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO students (name, rfid_tag, Bus_ID, school) VALUES (%s, %s, %s, %s)",
-                    (name, rfid, bus, school)
-                )
-                conn.commit()
+                storage.add_student(name, rfid, bus, school)
+                update_roster(("add", (name, rfid, bus, school)))
 
                 stdscr.clear()
                 stdscr.addstr(1, 2, "✅ STUDENT ADDED", curses.A_BOLD)
@@ -233,17 +2655,17 @@ def add_student(stdscr):
                 stdscr.addstr(6, 2, f"School: {school}")
                 stdscr.addstr(8, 2, "Press any key to continue...")
                 stdscr.refresh()
-                server_logs.put(f"✅ Added student: {name} (RFID: {rfid}, Bus: {bus}, School: {school})")
+                server_logs.put(f"✅ Added student: {name} (RFID: {rfid}, Bus: {bus}, School: {school})", LOG_OK)
                 stdscr.getch()
                 return
 
-            except pymysql.err.IntegrityError as e:
+            except DuplicateTag:
                 stdscr.clear()
-                msg = f"RFID {rfid} already exists!" if "rfid_tag" in str(e) else "Database error: " + str(e)
+                msg = f"RFID {rfid} already exists!"
                 stdscr.addstr(1, 2, "❌ ERROR", curses.A_BOLD)
                 stdscr.addstr(3, 2, msg)
                 stdscr.addstr(5, 2, "Press any key to try again...")
-                server_logs.put(f"❌ Failed to add student: {msg}")
+                server_logs.put(f"❌ Failed to add student: {msg}", LOG_ERROR)
                 stdscr.refresh()
                 stdscr.getch()
                 continue
@@ -253,15 +2675,11 @@ def add_student(stdscr):
                 stdscr.addstr(1, 2, "❌ DATABASE ERROR", curses.A_BOLD)
                 stdscr.addstr(3, 2, f"Error: {str(e)}")
                 stdscr.addstr(5, 2, "Press any key to continue...")
-                server_logs.put(f"❌ Error adding student: {e}")
+                server_logs.put(f"❌ Error adding student: {e}", LOG_ERROR)
                 stdscr.refresh()
                 stdscr.getch()
                 return
 
-            finally:
-                if conn:
-                    conn.close()
-
         except ValueError as e:
             stdscr.clear()
             stdscr.addstr(1, 2, "❌ INPUT ERROR", curses.A_BOLD)
@@ -289,20 +2707,19 @@ def delete_student(stdscr):
         curses.echo()
         try:
             stdscr.addstr("\nEnter the name of the student to delete: ")
-            name = stdscr.getstr().decode('utf-8')
+            name = prompt_student_name(stdscr, *stdscr.getyx())
+            if name is None:
+                return
             if not name:
                 raise ValueError("Name cannot be empty")
             
             curses.noecho()
             
-            conn = connect()
-            cursor = conn.cursor()
             try:
-                cursor.execute("SELECT * FROM students WHERE name = %s", (name,))
-                results = cursor.fetchall()
+                results = storage.find_students(name)
                 
                 if not results:
-                    server_logs.put(f"❌ No student found: {name}")
+                    server_logs.put(f"❌ No student found: {name}", LOG_ERROR)
                     stdscr.addstr("\nNo student found with that name.\nPress any key...")
                     stdscr.getch()
                     return
@@ -317,8 +2734,8 @@ def delete_student(stdscr):
                 confirm = stdscr.getch()
                 
                 if confirm == ord('y'):
-                    cursor.execute("DELETE FROM students WHERE name = %s", (name,))
-                    conn.commit()
+                    storage.delete_students(name)
+                    update_roster(("remove", name))
                     server_logs.put(f"🗑️ Deleted student: {name}")
                     stdscr.addstr("\n\nStudent(s) deleted! Press any key...")
                     stdscr.getch()
@@ -327,13 +2744,10 @@ def delete_student(stdscr):
                     stdscr.getch()
                 return
             except Exception as e:
-                server_logs.put(f"❌ Error deleting student: {e}")
+                server_logs.put(f"❌ Error deleting student: {e}", LOG_ERROR)
                 stdscr.addstr(f"\n\nError: {e}\nPress any key...")
                 stdscr.getch()
                 return
-            finally:
-                cursor.close()
-                conn.close()
                 
         except ValueError as e:
             curses.noecho()
@@ -350,58 +2764,44 @@ def delete_student(stdscr):
 
 # --------------------- Search Student Section --------------- # 
 # Searches for a student by name and displays their most recent bus activity
-# using today's attendance log and database lookup.
+# today, from the onboard state.
 
 def search_student(stdscr):
     curses.echo()
     stdscr.clear()
     stdscr.addstr(1, 2, "SEARCH STUDENT", curses.A_BOLD)
     stdscr.addstr(3, 2, "Enter Student Name: ")
-    name = stdscr.getstr().decode('utf-8').strip()
+    name = prompt_student_name(stdscr, 3, 22)
     curses.noecho()
+    if name is None:
+        return
+    width = stdscr.getmaxyx()[1] - 4
 
-    conn = connect()
-    cursor = conn.cursor()
     try:
-        cursor.execute("SELECT rfid_tag FROM students WHERE name = %s", (name,))
-        row = cursor.fetchone()
-        if not row:
-            stdscr.addstr(5, 2, f"❌ No student found with name '{name}'")
-            server_logs.put(f"❌ Search: No student found with name '{name}'")
+        rows = storage.find_students(name)
+        if not rows:
+            stdscr.addstr(5, 2, safe_truncate(f"❌ No student found with name '{name}'", width))
+            server_logs.put(f"❌ Search: No student found with name '{name}'", LOG_ERROR)
+            similar = roster.search_names(name, 3)
+            if similar:
+                stdscr.addstr(6, 2, safe_truncate(f"Did you mean: {', '.join(similar)}?", width))
         else:
-            rfid = row[0]
-            today = datetime.now().strftime("%Y-%m-%d")
-            log_path = f"logs/{today}_attendance.txt"
-            last_line = None
-            if os.path.exists(log_path):
-                with open(log_path, 'r') as f:
-                    lines = f.readlines()
-                    for line in reversed(lines):
-                        if name in line:
-                            last_line = line.strip()
-                            break
-            if last_line:
-                parts = last_line.split(" | ")
-                time_str = parts[0]
-                status = parts[2]
-                gps_time = parts[3] if len(parts) > 3 else "N/A"
-                coords = parts[4] if len(parts) > 4 else "N/A"
-                location = f"{gps_time} @ {coords}"
-                if status.lower() == "onboard":
-                    msg = f"🚌 {name} is currently ONBOARD bus at {location} (last seen {time_str})"
+            location = coordinator.student_location(rows[0][2])
+            if location:
+                bus_id, status, at, gps = location
+                time_str = time.strftime('%H:%M:%S', time.localtime(at))
+                if status == "ONBOARD":
+                    msg = f"🚌 {name} is currently ONBOARD bus {bus_id} at {gps} (last seen {time_str})"
                 else:
-                    msg = f"📤 {name} OFFBOARDED bus at {location} (last seen {time_str})"
-                stdscr.addstr(5, 2, msg)
+                    msg = f"📤 {name} OFFBOARDED bus {bus_id} at {gps} (last seen {time_str})"
+                stdscr.addstr(5, 2, safe_truncate(msg, width))
                 server_logs.put(f"🔍 Search result: {msg}")
             else:
-                stdscr.addstr(5, 2, f"⚠️ No recent log entry for {name} today.")
-                server_logs.put(f"⚠️ No log entry for {name} today.")
+                stdscr.addstr(5, 2, safe_truncate(f"⚠️ No bus activity for {name} today.", width))
+                server_logs.put(f"⚠️ No bus activity for {name} today.", LOG_WARNING)
     except Exception as e:
-        stdscr.addstr(5, 2, f"❌ Error: {e}")
-        server_logs.put(f"❌ Search error: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        stdscr.addstr(5, 2, safe_truncate(f"❌ Error: {e}", width))
+        server_logs.put(f"❌ Search error: {e}", LOG_ERROR)
 
     stdscr.addstr(7, 2, "Press any key to return...")
     stdscr.refresh()
@@ -429,7 +2829,10 @@ def safe_truncate(s, max_width):
 
 # --------------- PING BUS FEATURE --------------- #
 # Sends a PING request to a connected bus client by Bus ID.
-# Waits briefly for a response and displays the result in the UI.
+# Waits up to PING_TIMEOUT for the matching PONG and displays the result
+# in the UI.
+
+PING_TIMEOUT = 5.0
 
 def ping_bus(stdscr):
     curses.echo()
@@ -440,43 +2843,239 @@ def ping_bus(stdscr):
     curses.noecho()
     stdscr.clear()
 
-    if bus_id in client_bus_map:
-        client_socket = client_bus_map[bus_id]
+    if bus_is_connected(bus_id):
+        server_logs.put(f"📡 Sent PING to {bus_id}, waiting for response...")
+        future = request_bus(bus_id, "PING")
         try:
-            client_socket.sendall(b"PING\n")
-            server_logs.put(f"📡 Sent PING to {bus_id}, waiting for response...")
-            
-            # Wait for a moment to let handle_client log the response
-            start_time = time.time()
-            response_found = None
-
-            while time.time() - start_time < 5.0:
-                time.sleep(0.1)
-                for line in reversed(LOG_HISTORY):
-                    if f"Ping response from {bus_id}:" in line:
-                        response_found = line
-                        break
-                if response_found:
-                    break
-
-            if response_found:
-                stdscr.addstr(1, 2, f"📡 {response_found.strip()}")
-            else:
-                stdscr.addstr(1, 2, f"⏱️ No response from {bus_id}")
-
+            reply, rtt = future.result(timeout=PING_TIMEOUT)
+            response = f"📡 Ping response from {bus_id}: {reply} ({rtt * 1000:.0f} ms)"
+            server_logs.put(response)
+            stdscr.addstr(1, 2, safe_truncate(response, stdscr.getmaxyx()[1] - 4))
+        except concurrent.futures.TimeoutError:
+            pending_requests.discard(future)
+            stdscr.addstr(1, 2, f"⏱️ No response from {bus_id}")
         except Exception as e:
-            server_logs.put(f"❌ Error pinging {bus_id}: {e}")
+            server_logs.put(f"❌ Error pinging {bus_id}: {e}", LOG_ERROR)
             stdscr.addstr(1, 2, f"❌ Error: {e}")
+        stdscr.addstr(2, 2, format_liveness(bus_id))
+        client = connection_registry.get(bus_id)
+        if client is not None:
+            stdscr.addstr(3, 2, safe_truncate(f"🔌 {client.describe()}", stdscr.getmaxyx()[1] - 4))
     else:
         stdscr.addstr(1, 2, f"❌ Bus '{bus_id}' not connected.")
 
-    stdscr.addstr(3, 2, "Press any key to return...")
+    stdscr.addstr(5, 2, "Press any key to return...")
+    stdscr.refresh()
+    stdscr.getch()
+
+# --------------- PING ALL BUSES --------------- #
+# Sends a PING to every connected bus at once and gathers the replies
+# against a single PING_TIMEOUT deadline, then lists each bus's round
+# trip (slowest first) or the buses that did not answer.
+
+def ping_all_buses(stdscr):
+    stdscr.clear()
+    stdscr.addstr(1, 2, "PING ALL BUSES", curses.A_BOLD)
+    buses = coordinator.connected_buses()
+    if not buses:
+        stdscr.addstr(3, 2, "❌ No buses connected.")
+    else:
+        stdscr.addstr(3, 2, f"📡 Pinging {len(buses)} bus(es)...")
+        stdscr.refresh()
+        futures = {request_bus(bus_id, "PING"): bus_id for bus_id in buses}
+        done, not_done = concurrent.futures.wait(futures, timeout=PING_TIMEOUT)
+        for future in not_done:
+            pending_requests.discard(future)
+
+        answered = sorted(
+            ((future.result()[1], futures[future]) for future in done if future.exception() is None),
+            reverse=True
+        )
+        silent = sorted(bus_id for future, bus_id in futures.items() if future not in done or future.exception())
+        summary = f"📡 Ping all: {len(answered)}/{len(buses)} answered within {PING_TIMEOUT:.0f}s"
+        server_logs.put(summary, LOG_WARNING if silent else LOG_INFO)
+        stdscr.addstr(3, 2, summary)
+
+        lines = [f"- {bus_id}: {rtt * 1000:.0f} ms" for rtt, bus_id in answered]
+        lines += [f"- {bus_id}: ⏱️ no response" for bus_id in silent]
+        rows = stdscr.getmaxyx()[0] - 8
+        for i, line in enumerate(lines[:rows], start=5):
+            stdscr.addstr(i, 4, line)
+        if len(lines) > rows:
+            stdscr.addstr(5 + rows, 4, f"... and {len(lines) - rows} more")
+
+    stdscr.addstr(stdscr.getmaxyx()[0] - 2, 2, "Press any key to return...")
+    stdscr.refresh()
+    stdscr.getch()
+
+# Describes a bus's last heartbeat, e.g. "Last seen 4s ago, RTT 120 ms".
+
+def format_liveness(bus_id):
+    liveness = coordinator.bus_liveness(bus_id)
+    if liveness is None:
+        return "💤 No heartbeat recorded yet"
+    last_seen, rtt = liveness
+    rtt_text = f"{rtt * 1000:.0f} ms" if rtt is not None else "n/a"
+    return f"💓 Last seen {time.time() - last_seen:.0f}s ago, RTT {rtt_text}"
+
+# --------------- WHO'S ONBOARD --------------- #
+# Shows, for one bus, the students on it now and the students assigned to
+# it (from the roster cache) who have not boarded it today. With no bus
+# ID it lists how many students are on each bus.
+
+def onboard_status(stdscr):
+    curses.echo()
+    stdscr.clear()
+    stdscr.addstr(1, 2, "WHO'S ONBOARD", curses.A_BOLD)
+    stdscr.addstr(3, 2, "Bus ID (blank for all): ")
+    bus_id = stdscr.getstr().decode('utf-8').strip()
+    curses.noecho()
+
+    height, width = stdscr.getmaxyx()
+    try:
+        if not bus_id:
+            counts = coordinator.rider_counts()
+            summary = f"🚌 {sum(counts.values())} student(s) on {len(counts)} bus(es)"
+            lines = [f"- {bus}: {count} onboard" for bus, count in sorted(counts.items())]
+        else:
+            riders = sorted((roster.name(rfid) or rfid, at) for rfid, at in coordinator.riders(bus_id))
+            waiting = sorted(roster.name(rfid) or rfid for rfid in roster.bus_tags(bus_id) - coordinator.boarded_today(bus_id))
+            summary = f"🚌 Bus {bus_id}: {len(riders)} onboard, {len(waiting)} not boarded today"
+            lines = [f"- {name} (since {time.strftime('%H:%M', time.localtime(at))})" for name, at in riders]
+            if waiting:
+                lines += ["", "Assigned, not boarded today:"] + [f"- {name}" for name in waiting]
+        server_logs.put(f"🔍 {summary}")
+        stdscr.addstr(5, 2, safe_truncate(summary, width - 4))
+        rows = height - 10
+        for i, line in enumerate(lines[:rows], start=7):
+            stdscr.addstr(i, 4, safe_truncate(line, width - 6))
+        if len(lines) > rows:
+            stdscr.addstr(7 + rows, 4, f"... and {len(lines) - rows} more")
+    except Exception as e:
+        stdscr.addstr(5, 2, f"❌ Error: {e}")
+        server_logs.put(f"❌ Onboard query error: {e}", LOG_ERROR)
+
+    stdscr.addstr(height - 2, 2, "Press any key to return...")
     stdscr.refresh()
     stdscr.getch()
 
+
+# --------------- PAGED STUDENT LISTS --------------- #
+# Student lists are read a page at a time with keyset pagination: each
+# query continues from the last (name, id) shown, "WHERE name > %s OR
+# (name = %s AND id > %s) ORDER BY name, id LIMIT n", which the name and
+# (Bus_ID, name) indexes answer without scanning or sorting earlier rows.
+# Paging back runs the same query in reverse from the first row shown.
+# Only the current page (STUDENT_PAGE_ROWS rows) is held, drawn into a
+# curses pad that scrolls inside the menu window, so memory and latency
+# stay flat however many students are registered. Totals come from the
+# roster cache instead of a COUNT(*).
+
+STUDENT_PAGE_ROWS = 200
+
+
+class StudentPager:
+    """Keyset-paginated view of the students table, ordered by name"""
+
+    def __init__(self, columns, bus_id=None):
+        self.columns = columns      # selected after name and id
+        self.bus_id = bus_id
+        self.rows = []              # (name, id, *columns)
+        self.start = 0              # position of rows[0] in the whole list
+        self.has_prev = False
+        self.has_next = False
+
+    def query(self, forward, key):
+        # One extra row says whether more follow.
+        rows = storage.student_page(self.columns, self.bus_id, forward, key, STUDENT_PAGE_ROWS + 1)
+        more = len(rows) > STUDENT_PAGE_ROWS
+        rows = rows[:STUDENT_PAGE_ROWS]
+        if not forward:
+            rows.reverse()
+        return rows, more
+
+    def first(self):
+        self.rows, self.has_next = self.query(True, None)
+        self.start = 0
+        self.has_prev = False
+
+    def next_page(self):
+        if not self.has_next:
+            return False
+        rows, more = self.query(True, self.rows[-1][:2])
+        if not rows:
+            self.has_next = False
+            return False
+        self.start += len(self.rows)
+        self.rows, self.has_next, self.has_prev = rows, more, True
+        return True
+
+    def prev_page(self):
+        if not self.has_prev:
+            return False
+        rows, more = self.query(False, self.rows[0][:2])
+        if not rows:
+            self.has_prev = False
+            return False
+        self.start = max(0, self.start - len(rows))
+        self.rows, self.has_prev, self.has_next = rows, more, True
+        return True
+
+
+# Shows a pager's rows in a pad inside stdscr (the menu window) below
+# the given header lines. Arrows/j/k scroll a line, PgUp/PgDn or space a
+# screen, and scrolling past either end of the page loads the next or
+# previous page. q or Esc returns.
+
+def browse_students(stdscr, pager, format_row, total):
+    height, width = stdscr.getmaxyx()
+    top_y, left_x = stdscr.getbegyx()
+    first_line = 5
+    view_rows = height - first_line - 3
+    top = 0
+    while True:
+        pad = curses.newpad(max(1, len(pager.rows)), width - 4)
+        for i, row in enumerate(pager.rows):
+            try:
+                pad.addstr(i, 0, safe_truncate(format_row(row), width - 6))
+            except curses.error:
+                pass
+        while True:
+            shown = min(view_rows, len(pager.rows) - top)
+            stdscr.move(height - 3, 2)
+            stdscr.clrtoeol()
+            stdscr.addstr(height - 3, 2, f"{pager.start + top + 1}-{pager.start + top + shown} of {total}")
+            stdscr.move(height - 2, 2)
+            stdscr.clrtoeol()
+            stdscr.addstr(height - 2, 2, "↑↓ PgUp/PgDn scroll, q: back")
+            stdscr.box()
+            stdscr.noutrefresh()
+            pad.noutrefresh(top, 0, top_y + first_line, left_x + 2,
+                            top_y + first_line + view_rows - 1, left_x + width - 3)
+            curses.doupdate()
+
+            c = stdscr.getch()
+            step = {curses.KEY_DOWN: 1, ord('j'): 1, curses.KEY_UP: -1, ord('k'): -1,
+                    curses.KEY_NPAGE: view_rows, ord(' '): view_rows, curses.KEY_PPAGE: -view_rows}.get(c)
+            if c in (ord('q'), ord('Q'), 27):
+                return
+            if step is None:
+                continue
+            last_top = max(0, len(pager.rows) - view_rows)
+            if step > 0 and top >= last_top and pager.next_page():
+                top = 0
+                break
+            if step < 0 and top == 0 and pager.prev_page():
+                top = max(0, len(pager.rows) - view_rows)
+                break
+            top = min(max(0, top + step), last_top)
+        stdscr.move(first_line, 0)
+        stdscr.clrtobot()
+
+
 # --------------- Bus Roll Section ----------- # 
-# Queries the database for all students assigned to a specific Bus ID
-# and displays the list in the terminal UI.
+# Lists the students assigned to a specific Bus ID, a page at a time,
+# in the terminal UI.
 
 def bus_roll_query(stdscr):
     curses.echo()
@@ -485,60 +3084,55 @@ def bus_roll_query(stdscr):
     stdscr.addstr(3, 2, "Enter Bus ID: ")
     bus_id = stdscr.getstr().decode('utf-8').strip()
     curses.noecho()
-    
-    conn = connect()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT name FROM students WHERE Bus_ID = %s", (bus_id,))
-        students = cursor.fetchall()
 
-        if not students:
-            msg = f"❌ No students found for Bus ID '{bus_id}'"
-            stdscr.addstr(5, 2, msg)
-            server_logs.put(f"🔍 Roll query: {msg}")
-        else:
-            stdscr.addstr(5, 2, f"🚌 Students assigned to Bus '{bus_id}':")
-            server_logs.put(f"🔍 Roll query for Bus {bus_id} returned {len(students)} student(s).")
-            for i, (name,) in enumerate(students, start=6):
-                stdscr.addstr(i, 4, f"- {name}")
+    pager = StudentPager((), bus_id)
+    try:
+        pager.first()
     except Exception as e:
         stdscr.addstr(5, 2, f"❌ Error: {e}")
-        server_logs.put(f"❌ Roll query error: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        server_logs.put(f"❌ Roll query error: {e}", LOG_ERROR)
+        pager = None
+
+    if pager is not None and not pager.rows:
+        msg = f"❌ No students found for Bus ID '{bus_id}'"
+        stdscr.addstr(5, 2, msg)
+        server_logs.put(f"🔍 Roll query: {msg}")
+    elif pager is not None:
+        total = len(roster.bus_tags(bus_id)) or "?"
+        stdscr.addstr(3, 2, safe_truncate(f"🚌 Students assigned to Bus '{bus_id}':", stdscr.getmaxyx()[1] - 4))
+        server_logs.put(f"🔍 Roll query for Bus {bus_id}: {total} student(s).")
+        try:
+            browse_students(stdscr, pager, lambda row: f"- {row[0]}", total)
+        except Exception as e:
+            server_logs.put(f"❌ Roll query error: {e}", LOG_ERROR)
+        return
 
-    stdscr.addstr(len(students) + 7 if students else 7, 2, "Press any key to return...")
+    stdscr.addstr(7, 2, "Press any key to return...")
     stdscr.refresh()
     stdscr.getch()
 
 # --------------- Query Entire Database -------------# 
-# Displays all registered students from the database,
+# Displays all registered students from the database, a page at a time,
 # including their names and associated schools, in alphabetical order.
 
 def view_all_students(stdscr):
     stdscr.clear()
     stdscr.addstr(1, 2, "ALL REGISTERED STUDENTS", curses.A_BOLD)
-    conn = connect()
-    cursor = conn.cursor()
+    pager = StudentPager(("school",))
     try:
-        cursor.execute("SELECT name, school FROM students ORDER BY name")
-        students = cursor.fetchall()
-        if not students:
+        pager.first()
+        if not pager.rows:
             stdscr.addstr(3, 2, "❌ No students found in the database.")
             server_logs.put("🔍 Full DB query: No students found.")
         else:
-            stdscr.addstr(3, 2, f"📋 Total Students: {len(students)}")
-            for i, (name, school) in enumerate(students, start=5):
-                stdscr.addstr(i, 4, f"- {name} ({school})")
-            server_logs.put(f"📋 Full DB query returned {len(students)} student(s).")
+            stdscr.addstr(3, 2, f"📋 Total Students: {len(roster)}")
+            server_logs.put(f"📋 Full DB query: {len(roster)} student(s).")
+            browse_students(stdscr, pager, lambda row: f"- {row[0]} ({row[2]})", len(roster))
+            return
     except Exception as e:
         stdscr.addstr(3, 2, f"❌ Error: {e}")
-        server_logs.put(f"❌ DB query error: {e}")
-    finally:
-        cursor.close()
-        conn.close()
-    stdscr.addstr(len(students) + 6 if students else 6, 2, "Press any key to return...")
+        server_logs.put(f"❌ DB query error: {e}", LOG_ERROR)
+    stdscr.addstr(6, 2, "Press any key to return...")
     stdscr.refresh()
     stdscr.getch()
 
@@ -562,20 +3156,15 @@ def clear_all_students(stdscr):
         stdscr.getch()
         return
 
-    conn = connect()
-    cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM students")
-        conn.commit()
+        storage.clear_students()
+        update_roster(("clear",))
         msg = "🧹 All student records cleared from database."
         stdscr.addstr(5, 2, msg)
         server_logs.put(msg)
     except Exception as e:
         stdscr.addstr(5, 2, f"❌ Error: {e}")
-        server_logs.put(f"❌ Clear DB error: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+        server_logs.put(f"❌ Clear DB error: {e}", LOG_ERROR)
     stdscr.addstr(7, 2, "Press any key to return...")
     stdscr.refresh()
     stdscr.getch()
@@ -590,6 +3179,9 @@ def curses_main(stdscr):
     curses.start_color()
     curses.init_pair(1, curses.COLOR_GREEN, curses.COLOR_BLACK)
     curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
+    curses.init_pair(3, curses.COLOR_YELLOW, curses.COLOR_BLACK)
+    severity_colors = {LOG_OK: curses.color_pair(1), LOG_ERROR: curses.color_pair(2),
+                       LOG_WARNING: curses.color_pair(3), LOG_INFO: curses.A_NORMAL}
 
     while True:
         height, width = stdscr.getmaxyx()
@@ -644,27 +3236,26 @@ def curses_main(stdscr):
             menu_win.addstr(10, 4, "5. Search Students")
             menu_win.addstr(11, 4, "6. Ping a Bus")
             menu_win.addstr(12, 4, "7. Bus Roster by ID")
-            menu_win.addstr(13, 4, "8. Exit Program")
-            menu_win.addstr(height - 3, 2, "Select option (1-8): _")
+            menu_win.addstr(13, 4, "9. Ping All Buses")
+            menu_win.addstr(14, 4, "0. Who's Onboard")
+            menu_win.addstr(15, 4, "8. Exit Program")
+            if event_pipeline.started:
+                menu_win.addstr(16, 2, "EVENT PIPELINE", curses.A_UNDERLINE)
+                for row, stage in enumerate(event_pipeline.stages, 17):
+                    done = metrics.value("busserver_stage_items_total", stage.labels)
+                    menu_win.addstr(row, 4, f"{stage.name:<9} queued {stage.depth():<5} done {done}"[:menu_width - 6])
+            menu_win.addstr(height - 3, 2, "Select option (0-9): _")
             menu_win.refresh()
 
             log_win.erase()
             log_win.box()
             log_win.addstr(1, 1, " SERVER ACTIVITY LOGS ", curses.A_BOLD)
-            while not server_logs.empty():
-                new_log = server_logs.get()
-                LOG_HISTORY.append(new_log)
-                if len(LOG_HISTORY) > MAX_LOG_LINES:
-                    LOG_HISTORY.pop(0)
-            for i, line in enumerate(LOG_HISTORY[-MAX_LOG_LINES:], 3):
+            dropped = server_logs.dropped()
+            if dropped:
+                log_win.addstr(1, 24, f"({dropped} older line(s) dropped)", curses.color_pair(3))
+            for i, (_, level, line) in enumerate(server_logs.tail(MAX_LOG_LINES, LOG_DISPLAY_LEVEL), 3):
                 try:
-                    log_line = safe_truncate(line, log_width - 4)
-                    if "✅" in line or "🟢" in line:
-                        log_win.addstr(i, 2, log_line, curses.color_pair(1))
-                    elif "❌" in line or "🔴" in line:
-                        log_win.addstr(i, 2, log_line, curses.color_pair(2))
-                    else:
-                        log_win.addstr(i, 2, log_line)
+                    log_win.addstr(i, 2, safe_truncate(line, log_width - 4), severity_colors[level])
                 except curses.error:
                     pass
             log_win.noutrefresh()
@@ -695,15 +3286,38 @@ def curses_main(stdscr):
                     menu_win.timeout(-1)
                     bus_roll_query(menu_win)
                 elif c == ord('8'):
-                    return    
+                    return
+                elif c == ord('9'):
+                    menu_win.timeout(-1)
+                    ping_all_buses(menu_win)
+                elif c == ord('0'):
+                    menu_win.timeout(-1)
+                    onboard_status(menu_win)
 
 # Entry point of the application.
-# Starts the server in a background thread and launches the curses UI.
+# Loads the roster cache and today's onboard state, starts the server (asyncio or threaded, see SERVER_MODE) in a background
+# thread, or the worker processes if WORKER_PROCESSES is set, and launches
+# the curses UI.
 
 def main():
-    server_thread = threading.Thread(target=start_server_thread, daemon=True)
-    server_thread.start()
+    load_roster()
+    load_onboard_state()
+    threading.Thread(target=run_roster_refresh, daemon=True).start()
+    if WORKER_PROCESSES:
+        manager = start_workers()
+    else:
+        target = start_async_server_thread if SERVER_MODE == "asyncio" else start_server_thread
+        server_thread = threading.Thread(target=target, daemon=True)
+        server_thread.start()
+        threading.Thread(target=run_heartbeats, daemon=True).start()
+        start_attendance_writer()
+        event_pipeline.start()
+    start_metrics_server(METRICS_PORT)
     curses.wrapper(curses_main)
+    if WORKER_PROCESSES:
+        stop_workers(manager)
+    else:
+        stop_ingest()
 
 if __name__ == "__main__":
     main()